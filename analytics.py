@@ -0,0 +1,140 @@
+import datetime
+
+import numpy as np
+
+from logmanager import LogManager
+from metrics import metrics
+from records import Unit
+
+LOG_TYPES = ["Practice", "Scrimmage", "Match"]
+RESULTS = ["Win", "Loss", "N/A"]
+
+
+def lookup(values: list, value) -> int:
+    return values.index(value) if value in values else -1
+
+
+class LogColumns:
+    """
+    Every team's log as parallel column arrays, one element per log entry.
+    team indexes into team_ids, unit holds Unit values and log_type/result index into LOG_TYPES/RESULTS with -1
+    for unknown.
+    """
+    __slots__ = ("team_ids", "team", "date", "log_type", "amount", "unit", "result")
+
+    def __init__(self, team_ids, team, date, log_type, amount, unit, result):
+        self.team_ids = team_ids
+        self.team = team
+        self.date = date
+        self.log_type = log_type
+        self.amount = amount
+        self.unit = unit
+        self.result = result
+
+    @classmethod
+    def load(cls, log_manager: LogManager) -> "LogColumns":
+        team_ids = [team["id"] for team in log_manager.teams]
+        team, date, log_type, amount, unit, result = [], [], [], [], [], []
+        for index, team_id in enumerate(team_ids):
+            for entry in log_manager.load_log(team_id):
+                team.append(index)
+                date.append(entry.date)
+                log_type.append(lookup(LOG_TYPES, entry.log_type))
+                amount.append(entry.duration)
+                unit.append(entry.unit)
+                result.append(lookup(RESULTS, entry.result))
+        return cls(
+            team_ids,
+            np.array(team, dtype=np.int32),
+            np.array(date, dtype=np.int32),
+            np.array(log_type, dtype=np.int8),
+            np.array(amount, dtype=np.float64),
+            np.array(unit, dtype=np.int8),
+            np.array(result, dtype=np.int8)
+        )
+
+
+def aggregate(columns: LogColumns, groups: np.ndarray, group_count: int, start: int, end: int, weeks: int) -> dict:
+    """
+    Computes practice statistics for every group in one pass over the columns.
+    :param columns: The logs.
+    :param groups: The group index of every team in columns.team_ids.
+    :param group_count: How many groups there are.
+    :param start: The first date ordinal to include.
+    :param end: The last date ordinal to include.
+    :param weeks: How many weeks start to end covers.
+    :return: A dict of statistic name to an array with one value per group.
+    """
+    in_range = (columns.date >= start) & (columns.date <= end)
+    group = groups[columns.team]
+
+    def count(mask, weights=None):
+        return np.bincount(group[mask], weights=None if weights is None else weights[mask], minlength=group_count)
+
+    hours = count(in_range & (columns.unit == Unit.HOURS), columns.amount)
+    scrims = count(in_range & (columns.log_type == LOG_TYPES.index("Scrimmage")))
+    wins = count(in_range & (columns.result == RESULTS.index("Win")))
+    losses = count(in_range & (columns.result == RESULTS.index("Loss")))
+    decided = wins + losses
+    with np.errstate(invalid="ignore", divide="ignore"):
+        win_rate = np.where(decided > 0, wins / decided, np.nan)
+
+    return {
+        "logs": count(in_range),
+        "hours": hours,
+        "weekly_hours": hours / weeks,
+        "scrims": scrims,
+        "weekly_scrims": scrims / weeks,
+        "wins": wins,
+        "losses": losses,
+        "win_rate": win_rate
+    }
+
+
+class PracticeAnalytics:
+    """
+    Practice statistics over a LogManager's logs. The column arrays are rebuilt only when a team or a log changes.
+    """
+
+    def __init__(self, log_manager: LogManager):
+        self.log_manager = log_manager
+        self.columns: LogColumns = None
+        self.columns_key = None
+
+    def get_columns(self) -> LogColumns:
+        key = (
+            self.log_manager.teams_version,
+            tuple(self.log_manager.log_versions.get(team["id"], 0) for team in self.log_manager.teams)
+        )
+        metrics.record_cache("analytics_columns", self.columns is not None and self.columns_key == key)
+        if self.columns is None or self.columns_key != key:
+            self.columns = LogColumns.load(self.log_manager)
+            self.columns_key = key
+        return self.columns
+
+    def get_stats(self, by: str = "team", weeks: int = 4, today: datetime.date = None) -> list[dict]:
+        """
+        Computes weekly hours, scrim frequency and win rates over the last few weeks.
+        :param by: "team" for one row per team, "game" for one row per game.
+        :param weeks: Optional: how many weeks back to look.
+        :param today: Optional: the last day to include.
+        :return: One dict per team or game, with a "name" and the statistics from aggregate.
+        """
+        assert by in ["team", "game"] and weeks > 0
+        columns = self.get_columns()
+        end = (today if today else datetime.date.today()).toordinal()
+        start = end - weeks * 7 + 1
+
+        teams = [self.log_manager.get_team(team_id) for team_id in columns.team_ids]
+        if by == "team":
+            names = [team["team_name"] for team in teams]
+            groups = np.arange(len(teams), dtype=np.int32)
+        else:
+            names = sorted({str(team["game"]) for team in teams})
+            groups = np.array([names.index(str(team["game"])) for team in teams], dtype=np.int32)
+
+        stats = aggregate(columns, groups, len(names), start, end, weeks)
+        return [
+            {"name": name, **{stat: values[index].item() for stat, values in stats.items()}}
+            for index, name in enumerate(names)
+        ]
@@ -0,0 +1,119 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from columnar import write_tables
+from logmanager import LogManager
+
+# Lock keys for operations that aren't about a single team's log.
+TEAMS_KEY = "teams"
+MEGA_LOG_KEY = "mega_log"
+STATS_KEY = "stats"
+IMPORT_KEY = "import"
+
+
+class AsyncLogManager:
+    """
+    An awaitable facade over LogManager. Every call runs in a bounded thread pool so that disk I/O never
+    blocks the event loop. Calls on the same team's log are serialized, as are calls that change team info.
+    """
+
+    def __init__(
+            self,
+            log_manager: LogManager,
+            max_workers: int = 4,
+            executor: ThreadPoolExecutor = None,
+            max_running: int = None
+    ):
+        """
+        :param log_manager: The LogManager to wrap.
+        :param max_workers: Optional: how many threads the pool has.
+        :param executor: Optional: a thread pool to share with other AsyncLogManagers. It is not shut down by this.
+        :param max_running: Optional: the most calls this may have in the pool at once, so that it leaves threads
+            for the others sharing it. Defaults to max_workers.
+        """
+        self.log_manager = log_manager
+        self.owns_executor = executor is None
+        self.executor = executor if executor is not None else ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="logmanager"
+        )
+        self.locks: dict[object, asyncio.Lock] = {}
+        self.running = asyncio.Semaphore(max_running or max_workers)
+
+    def lock_for(self, key) -> asyncio.Lock:
+        if key not in self.locks:
+            self.locks[key] = asyncio.Lock()
+        return self.locks[key]
+
+    async def run(self, key, function, *args, **kwargs):
+        """
+        Runs a function in the thread pool while holding the lock for a key.
+        :param key: The team id, or one of the module's lock keys.
+        :param function: The blocking function to run.
+        :return: Whatever the function returns.
+        """
+        async with self.lock_for(key), self.running:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, functools.partial(function, *args, **kwargs)
+            )
+
+    async def create_team(self, team_name: str, id: str = None, player_ids: list[int] = None, game: str = None) -> int:
+        return await self.run(TEAMS_KEY, self.log_manager.create_team, team_name, id, player_ids, game)
+
+    async def add_player_to_team(self, team_id: int, player_id: int) -> dict:
+        return await self.run(TEAMS_KEY, self.log_manager.add_player_to_team, team_id, player_id)
+
+    async def remove_player_from_team(self, team_id: int, player_id: int) -> dict:
+        return await self.run(TEAMS_KEY, self.log_manager.remove_player_from_team, team_id, player_id)
+
+    async def add_game_to_team(self, team_id: int, game_name: str) -> dict:
+        return await self.run(TEAMS_KEY, self.log_manager.add_game_to_team, team_id, game_name)
+
+    async def add_log(self, team_id: int, *args, **kwargs):
+        return await self.run(team_id, self.log_manager.add_log, team_id, *args, **kwargs)
+
+    async def add_logs(self, team_id: int, entries: list):
+        return await self.run(team_id, self.log_manager.add_logs, team_id, entries)
+
+    async def get_log_as_objects(self, team_id: int) -> list[dict]:
+        return await self.run(team_id, self.log_manager.get_log_as_objects, team_id)
+
+    async def export_log(self, team_id: int):
+        return await self.run(team_id, self.log_manager.export_log, team_id)
+
+    async def export_log_range(self, team_id: int, start, end):
+        return await self.run(team_id, self.log_manager.export_log_range, team_id, start, end)
+
+    async def get_most_recent_practice(self, team_id: int, include_matches=False) -> dict:
+        return await self.run(team_id, self.log_manager.get_most_recent_practice, team_id, include_matches)
+
+    async def get_most_recent_practices(self, team_ids: list[int], include_matches=False) -> dict:
+        """
+        Gets the most recent practice of several teams at once, running the teams in parallel.
+        :param team_ids: The ids of the teams.
+        :return: A dict of team id to most recent practice.
+        """
+        practices = await asyncio.gather(*[
+            self.get_most_recent_practice(team_id, include_matches) for team_id in team_ids
+        ])
+        return dict(zip(team_ids, practices))
+
+    async def get_mega_log(self, compression: str = None):
+        return await self.run(MEGA_LOG_KEY, self.log_manager.get_mega_log, compression)
+
+    async def get_mega_log_columnar(self, file_format: str):
+        """
+        Exports every team's log as one Parquet or Arrow file. Each team's table is built in parallel, under that
+        team's lock, and then they are concatenated.
+        :param file_format: "parquet" or "arrow".
+        :return: A buffer with the file in it and the file name to give it.
+        """
+        team_ids = await self.run(TEAMS_KEY, lambda: [team["id"] for team in self.log_manager.teams])
+        tables = await asyncio.gather(*[
+            self.run(team_id, self.log_manager.get_team_table, team_id) for team_id in team_ids
+        ])
+        return await self.run(MEGA_LOG_KEY, write_tables, tables, file_format)
+
+    def shutdown(self):
+        if self.owns_executor:
+            self.executor.shutdown(wait=True)
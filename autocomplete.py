@@ -0,0 +1,88 @@
+import bisect
+import difflib
+import heapq
+
+# Discord shows at most this many autocomplete choices.
+MAX_CHOICES = 25
+
+
+class PrefixIndex:
+    """
+    An autocomplete index over a set of names.
+    Names are casefolded once and kept sorted, so prefix matches are found with a bisect instead of a scan.
+    Results are prefix matches, then substring matches, then close fuzzy matches, each ranked by how often
+    the name has been used and capped at Discord's choice limit.
+    """
+
+    def __init__(self, names=(), loader=None):
+        """
+        :param names: Optional: the names to start with.
+        :param loader: Optional: a function returning more names, called the first time the index is used.
+        """
+        self.keys: list[str] = []
+        self.names: dict[str, str] = {}
+        self.uses: dict[str, int] = {}
+        self.loader = loader
+        for name in names:
+            self.add(name)
+
+    def __len__(self):
+        self.load()
+        return len(self.keys)
+
+    def load(self):
+        if self.loader is not None:
+            loader, self.loader = self.loader, None
+            for name in loader():
+                self.add(name)
+
+    def add(self, name: str):
+        self.load()
+        key = name.casefold()
+        if key not in self.names:
+            bisect.insort(self.keys, key)
+        self.names[key] = name
+
+    def remove(self, name: str):
+        self.load()
+        key = name.casefold()
+        if key in self.names:
+            del self.keys[bisect.bisect_left(self.keys, key)]
+            del self.names[key]
+            self.uses.pop(key, None)
+
+    def record_use(self, name: str):
+        self.load()
+        key = name.casefold()
+        if key in self.names:
+            self.uses[key] = self.uses.get(key, 0) + 1
+
+    def rank(self, keys, limit: int) -> list[str]:
+        # Most used first, then alphabetical.
+        return heapq.nsmallest(limit, keys, key=lambda key: (-self.uses.get(key, 0), key))
+
+    def search(self, value: str, limit: int = MAX_CHOICES) -> list[str]:
+        """
+        Finds the names that best match what has been typed so far.
+        :param value: What the user has typed.
+        :param limit: Optional: the most names to return.
+        :return: The matching names, best first.
+        """
+        self.load()
+        value = (value or "").strip().casefold()
+        start = bisect.bisect_left(self.keys, value)
+        end = start
+        while end < len(self.keys) and self.keys[end].startswith(value):
+            end += 1
+        matches = self.rank(self.keys[start:end], limit)
+
+        if len(matches) < limit and value:
+            substring = [key for key in self.keys if value in key and not key.startswith(value)]
+            matches += self.rank(substring, limit - len(matches))
+
+        if len(matches) < limit and len(value) >= 3:
+            seen = set(matches)
+            close = difflib.get_close_matches(value, self.keys, n=limit, cutoff=0.6)
+            matches += [key for key in close if key not in seen][:limit - len(matches)]
+
+        return [self.names[key] for key in matches]
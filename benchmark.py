@@ -0,0 +1,210 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+from types import SimpleNamespace
+
+import practice_log_cog
+from guilds import GuildPartitions
+from records import LogEntry, Unit
+from storage import write_atomically, write_log_file
+
+# Times the main LogManager operations and the commands built on them against a synthetic dataset, without
+# connecting to Discord. Every run is appended to the results file so later runs can be compared against it.
+# Usage: python benchmark.py [--teams 40] [--years 2] [--per-week 3] [--compare]
+
+RESULTS_PATH = "benchmarks/results.jsonl"
+SUBMITTERS = ["alice", "bob", "carol", "dave", "erin", "frank"]
+OPPONENTS = ["UAB", "Auburn", "Alabama", "Georgia Tech", "Vanderbilt", ""]
+
+
+def generate(data_root: str, teams: int, years: float, per_week: float, seed: int = 0) -> list[dict]:
+    """
+    Writes a synthetic teams.json and one log per team, in the current log format.
+    :param data_root: The directory to write the data to.
+    :param teams: How many teams.
+    :param years: How many years of logs each team has, ending today.
+    :param per_week: How many logs each team has per week, on average.
+    :param seed: Optional: the random seed, so that the same arguments always give the same data.
+    :return: The teams.
+    """
+    rng = random.Random(seed)
+    os.makedirs(data_root + "teams/", exist_ok=True)
+    today = datetime.date.today().toordinal()
+    days = int(years * 365)
+
+    games = [acronym for name, acronym in practice_log_cog.games_with_acronyms]
+    team_list = []
+    for team_id in range(teams):
+        game = games[team_id % len(games)]
+        color = practice_log_cog.team_colors[(team_id // len(games)) % len(practice_log_cog.team_colors)]
+        team_list.append({
+            "team_name": f"{game} {color} {team_id}",
+            "id": team_id,
+            "players": [rng.randrange(10 ** 17, 10 ** 18) for _ in range(rng.randint(3, 7))],
+            "game": game
+        })
+
+        entries = []
+        for _ in range(int(days / 7 * per_week)):
+            date = today - rng.randrange(days)
+            log_type = rng.choice(["Practice", "Practice", "Scrimmage", "Match"])
+            entries.append(LogEntry(
+                date,
+                float(rng.randint(1, 4)),
+                rng.choice([Unit.HOURS, Unit.HOURS, Unit.GAMES, Unit.MAPS, Unit.BEST_OF]),
+                log_type,
+                date + rng.randrange(3),
+                rng.choice(SUBMITTERS),
+                "N/A" if log_type == "Practice" else rng.choice(["Win", "Loss"]),
+                "" if log_type == "Practice" else rng.choice(OPPONENTS)
+            ))
+        entries.sort(key=lambda entry: entry.date)
+        write_log_file(f"{data_root}teams/{team_id}.csv", entries)
+
+    write_atomically(data_root + "teams.json", json.dumps({"teams": team_list}, indent=4))
+    return team_list
+
+
+def measure(function, iterations: int) -> dict:
+    """
+    Calls a function repeatedly.
+    :return: The throughput and latency percentiles, in milliseconds.
+    """
+    seconds = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    seconds.sort()
+    return {
+        "iterations": iterations,
+        "ops_per_second": iterations / sum(seconds),
+        "p50_ms": seconds[len(seconds) // 2] * 1000,
+        "p99_ms": seconds[min(len(seconds) - 1, int(len(seconds) * 0.99))] * 1000
+    }
+
+
+def run_benchmarks(data_root: str, team_list: list[dict], iterations: int, seed: int = 0) -> dict:
+    rng = random.Random(seed)
+    loop = asyncio.new_event_loop()
+    partitions = GuildPartitions(data_root=data_root)
+    practice_log_cog.partitions = partitions
+    guild = partitions.get(None)
+    logger = guild.logger
+    team_ids = [team["id"] for team in team_list]
+
+    def autocomplete(callback, values):
+        def run():
+            ctx = SimpleNamespace(interaction=SimpleNamespace(guild_id=None), value=rng.choice(values))
+            loop.run_until_complete(callback(ctx))
+        return run
+
+    def cold_report():
+        # A new report has to read every team's most recent practice, like the first /log snitch.
+        guild.violator_report.loaded = False
+        loop.run_until_complete(practice_log_cog.sort_teams_into_bad_and_good(guild))
+
+    results = {}
+    results["load_teams"] = measure(lambda: logger.load_teams(), 1)
+    unread = iter(team_ids)
+    results["get_log_as_objects (cold)"] = measure(lambda: logger.get_log_as_objects(next(unread)), min(iterations, len(team_ids)))
+    results["get_log_as_objects"] = measure(lambda: logger.get_log_as_objects(rng.choice(team_ids)), iterations)
+    results["get_most_recent_practice"] = measure(lambda: logger.get_most_recent_practice(rng.choice(team_ids)), iterations)
+    results["add_log"] = measure(lambda: logger.add_log(
+        rng.choice(team_ids), datetime.date.today(), 2, "hours", "Practice", "benchmark", "N/A"
+    ), iterations)
+    results["get_mega_log (first)"] = measure(lambda: logger.get_mega_log(), 1)
+    results["get_mega_log"] = measure(lambda: logger.get_mega_log(), iterations)
+    results["get_mega_log zip"] = measure(lambda: logger.get_mega_log("zip"), max(1, iterations // 10))
+    results["sort_teams_into_bad_and_good (cold)"] = measure(cold_report, max(1, iterations // 10))
+    results["sort_teams_into_bad_and_good"] = measure(
+        lambda: loop.run_until_complete(practice_log_cog.sort_teams_into_bad_and_good(guild)), iterations
+    )
+    team_names = [team["team_name"] for team in team_list]
+    results["autocomplete team names"] = measure(
+        autocomplete(practice_log_cog.get_team_names, ["", "r", "va", "blue", "lol w"] + team_names), iterations
+    )
+    results["autocomplete games"] = measure(
+        autocomplete(practice_log_cog.get_games, ["", "r", "leg", "valroant"]), iterations
+    )
+
+    partitions.close()
+    loop.close()
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_previous(path: str, parameters: dict) -> dict:
+    """
+    :return: The most recent stored run with the same parameters, or None.
+    """
+    if not os.path.exists(path):
+        return None
+    previous = None
+    with open(path, "r") as file:
+        for line in file:
+            run = json.loads(line)
+            if run["parameters"] == parameters:
+                previous = run
+    return previous
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks LogManager against synthetic data.")
+    parser.add_argument("--teams", type=int, default=40)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--per-week", type=float, default=3)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=RESULTS_PATH, help="Where to append the results.")
+    parser.add_argument("--compare", action="store_true", help="Compare against the last run with the same arguments.")
+    args = parser.parse_args()
+
+    parameters = {
+        "teams": args.teams, "years": args.years, "per_week": args.per_week,
+        "iterations": args.iterations, "seed": args.seed
+    }
+    previous = load_previous(args.results, parameters) if args.compare else None
+
+    data_root = tempfile.mkdtemp(prefix="benchmark_") + "/"
+    try:
+        team_list = generate(data_root, args.teams, args.years, args.per_week, args.seed)
+        results = run_benchmarks(data_root, team_list, args.iterations, args.seed)
+    finally:
+        shutil.rmtree(data_root, ignore_errors=True)
+
+    print(f"{'Benchmark':<38} {'ops/s':>10} {'p50 ms':>9} {'p99 ms':>9}" + (f" {'p50 change':>11}" if previous else ""))
+    for name, result in results.items():
+        line = f"{name:<38} {result['ops_per_second']:>10.1f} {result['p50_ms']:>9.3f} {result['p99_ms']:>9.3f}"
+        if previous and name in previous["results"]:
+            change = result["p50_ms"] / previous["results"][name]["p50_ms"] - 1
+            line += f" {change:>+10.0%}"
+        print(line)
+
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+    with open(args.results, "a") as file:
+        file.write(json.dumps({
+            "time": datetime.datetime.now().isoformat(timespec="seconds"),
+            "commit": get_commit(),
+            "parameters": parameters,
+            "results": results
+        }) + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,118 @@
+import asyncio
+import datetime
 import os, discord
+import time
 import discord.ext.commands as commands
+from discord.ext import tasks
 import practice_log_cog
+from async_logmanager import TEAMS_KEY
+from cron import CronSchedule
+from metrics import metrics
+from storage import write_atomically
+
+class EsportsBot(commands.AutoShardedBot):
+    def __init__(
+            self,
+            *args,
+            reminder_cron: str = None,
+            reminder_channel_id: int = None,
+            reminder_dms: bool = False,
+            **kwargs
+    ):
+        """
+        :param reminder_cron: Optional: a cron expression for when to post the violators, such as "0 18 * * mon".
+        :param reminder_channel_id: Optional: the channel to post the violators in.
+        :param reminder_dms: Optional: whether to also DM the violators' players.
+        """
+        super().__init__(*args, **kwargs)
+        self.reminder_schedule = CronSchedule(reminder_cron) if reminder_cron else None
+        self.reminder_channel_id = reminder_channel_id
+        self.reminder_dms = reminder_dms
+        self.last_reminder: datetime.datetime = None
+        # DM waves run in the background so that they don't hold up the scheduler. Tasks are kept until they finish.
+        self.dm_tasks: set[asyncio.Task] = set()
+        # Where to dump metrics for Prometheus' node exporter to pick up, if anywhere.
+        self.metrics_path = os.getenv("UAH_ESPORTS_METRICS_FILE")
 
-class EsportsBot(commands.Bot):
     async def on_ready(self):
         print(f"Logged in as {self.user.name} ({self.user.id})")
+        if not self.scheduler.is_running():
+            self.scheduler.start()
+
+    async def invoke_application_command(self, ctx: discord.ApplicationContext):
+        start = time.perf_counter()
+        try:
+            await super().invoke_application_command(ctx)
+        finally:
+            metrics.observe("command_seconds", time.perf_counter() - start, operation=ctx.command.qualified_name)
+
+    async def on_application_command_error(self, context: discord.ApplicationContext, exception):
+        metrics.increment("command_errors_total", command=context.command.qualified_name)
+        await super().on_application_command_error(context, exception)
+
+    @tasks.loop(minutes=1)
+    async def scheduler(self):
+        # An exception would stop the loop for good, so a failed run is only reported.
+        try:
+            # Teams age past the violation threshold when the day changes, update() re-sorts the reports then.
+            for guild in practice_log_cog.partitions:
+                await guild.violator_report.update()
+
+            now = datetime.datetime.now().replace(second=0, microsecond=0)
+            if self.reminder_schedule and self.reminder_channel_id and now != self.last_reminder \
+                    and self.reminder_schedule.matches(now):
+                self.last_reminder = now
+                await self.post_reminder()
+
+            if self.metrics_path:
+                write_atomically(self.metrics_path, metrics.to_prometheus(), "metrics")
+        except Exception as error:
+            print(f"Scheduled task failed: {error!r}")
+
+    async def post_reminder(self):
+        # With several bot processes only the one running the channel's shard has it cached, and it alone posts.
+        channel = self.get_channel(self.reminder_channel_id)
+        if channel is None:
+            return
+        guild = await practice_log_cog.partitions.get(channel.guild.id if getattr(channel, "guild", None) else None).load()
+        guilty, innocent = await practice_log_cog.sort_teams_into_bad_and_good(guild)
+        team_map = await guild.async_logger.run(TEAMS_KEY, practice_log_cog.get_team_map, guild.logger)
+        msg = practice_log_cog.format_violators(team_map, guilty)
+        if msg is not None:
+            await practice_log_cog.dispatcher.send_to_channel(channel, msg)
+            if self.reminder_dms:
+                task = asyncio.create_task(practice_log_cog.dm_violators(self, team_map, guilty))
+                self.dm_tasks.add(task)
+                task.add_done_callback(self.dm_tasks.discard)
+
+    async def close(self):
+        self.scheduler.cancel()
+        await super().close()
+        practice_log_cog.partitions.close()
 
 
 def main():
     token = os.getenv("UAH_ESPORTS_TOKEN")
     intents = discord.Intents.default()
 
-    bot = EsportsBot(intents=intents)
+    reminder_channel = os.getenv("UAH_ESPORTS_REMINDER_CHANNEL")
+    # Leave these unset to run every shard in this process. To split the shards over several processes, give
+    # each the total count and its own comma separated shard ids, and point them all at one storage_server.py.
+    shard_count = os.getenv("UAH_ESPORTS_SHARD_COUNT")
+    shard_ids = os.getenv("UAH_ESPORTS_SHARD_IDS")
+    bot = EsportsBot(
+        intents=intents,
+        shard_count=int(shard_count) if shard_count else None,
+        shard_ids=[int(shard_id) for shard_id in shard_ids.split(",")] if shard_ids else None,
+        reminder_cron=os.getenv("UAH_ESPORTS_REMINDER_CRON"),
+        reminder_channel_id=int(reminder_channel) if reminder_channel else None,
+        reminder_dms=os.getenv("UAH_ESPORTS_REMINDER_DMS", "").lower() in ["1", "true", "yes"]
+    )
     bot.add_application_command(practice_log_cog.logs)
     bot.add_application_command(practice_log_cog.teams)
+    bot.add_application_command(practice_log_cog.admin)
     bot.run(token)
 
 
 if __name__ == '__main__':
     main()
-
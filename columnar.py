@@ -0,0 +1,94 @@
+import datetime
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+from records import LogEntry
+
+# File formats the mega log can be exported in besides CSV, and the file name of each.
+COLUMNAR_FORMATS = {"parquet": "mega_log.parquet", "arrow": "mega_log.arrow"}
+# Dates are days since the Unix epoch in Arrow, and ordinals in LogEntry.
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+def check_pyarrow():
+    if pa is None:
+        raise RuntimeError("Exporting as Parquet or Arrow needs pyarrow installed!")
+
+
+def get_schema():
+    """
+    The mega log's columns, typed. "Length" is split into a numeric duration and its unit, like log files store it.
+    Columns that repeat a few values are dictionary encoded.
+    """
+    check_pyarrow()
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema([
+        ("Team Name", text),
+        ("Team ID", pa.int64()),
+        ("Game", text),
+        ("Date", pa.date32()),
+        ("Duration", pa.float64()),
+        ("Unit", text),
+        ("Type", text),
+        ("Submitted On", pa.date32()),
+        ("Submitted By", text),
+        ("Result", text),
+        ("Opponent", text)
+    ])
+
+
+def build_team_table(team: dict, entries: list[LogEntry]):
+    """
+    Converts one team's log to an Arrow table with the mega log's columns.
+    :param team: The team.
+    :param entries: The team's log.
+    :return: A pyarrow.Table.
+    """
+    schema = get_schema()
+    count = len(entries)
+    columns = [
+        [team["team_name"]] * count,
+        [team["id"]] * count,
+        [team["game"]] * count,
+        pa.array([entry.date - EPOCH_ORDINAL for entry in entries], pa.int32()).cast(pa.date32()),
+        [entry.duration for entry in entries],
+        [entry.unit.label for entry in entries],
+        [entry.log_type for entry in entries],
+        pa.array([entry.submitted_on - EPOCH_ORDINAL for entry in entries], pa.int32()).cast(pa.date32()),
+        [entry.submitted_by for entry in entries],
+        [entry.result for entry in entries],
+        [entry.opponent for entry in entries]
+    ]
+    return pa.Table.from_arrays(
+        [column if isinstance(column, pa.Array) else pa.array(column, field.type) for column, field in zip(columns, schema)],
+        schema=schema
+    )
+
+
+def write_tables(tables: list, file_format: str) -> tuple[io.BytesIO, str]:
+    """
+    Concatenates team tables into one file.
+    Parquet files are zstd compressed and can be read a few columns at a time
+    (pyarrow.parquet.read_table(path, columns=[...])). Arrow IPC files are left uncompressed so that they can be
+    memory mapped without a copy (pyarrow.ipc.open_file(pyarrow.memory_map(path))).
+    :param tables: The tables from build_team_table.
+    :param file_format: "parquet" or "arrow".
+    :return: A buffer with the file in it and the file name to give it.
+    """
+    check_pyarrow()
+    table = pa.concat_tables(tables) if tables else get_schema().empty_table()
+    # Every team's table has its own dictionaries, unify them so that the file has one per column.
+    table = table.unify_dictionaries().combine_chunks()
+    buffer = io.BytesIO()
+    if file_format == "parquet":
+        pq.write_table(table, buffer, compression="zstd")
+    else:
+        feather.write_feather(table, buffer, compression="uncompressed")
+    buffer.seek(0)
+    return buffer, COLUMNAR_FORMATS[file_format]
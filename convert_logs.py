@@ -0,0 +1,18 @@
+import os
+
+from guilds import get_data_roots
+from storage import convert_log_file
+
+# Converts every log in data/teams/, and in every guild's data/guilds/{id}/teams/, to the current log format.
+# Version 1 files, including ones with outdated headers or blank lines, are rewritten atomically and files that
+# are already current are left alone.
+# The bot also converts old files the first time it uses them, so this only saves that work at runtime.
+# Usage: python convert_logs.py
+
+for data_root in get_data_roots():
+    teams_dir = data_root + "teams/"
+    if not os.path.isdir(teams_dir):
+        continue
+    for log_name in sorted(os.listdir(teams_dir)):
+        if log_name.endswith(".csv") and convert_log_file(teams_dir + log_name):
+            print(f"Converted {teams_dir}{log_name}")
@@ -0,0 +1,52 @@
+import datetime
+
+# (lowest, highest) of minute, hour, day of month, month and day of week. Day of week 0 and 7 are both Sunday.
+FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+DAY_NAMES = ["sun", "mon", "tue", "wed", "thu", "fri", "sat"]
+
+
+def parse_field(field: str, lowest: int, highest: int) -> set[int]:
+    values = set()
+    for part in field.lower().split(","):
+        part, _, step = part.partition("/")
+        step = int(step) if step else 1
+        if part == "*":
+            start, end = lowest, highest
+        else:
+            start, _, end = part.partition("-")
+            start = DAY_NAMES.index(start) if start in DAY_NAMES else int(start)
+            end = (DAY_NAMES.index(end) if end in DAY_NAMES else int(end)) if end else start
+        if not (lowest <= start <= end <= highest) or step < 1:
+            raise ValueError(f"\"{field}\" is out of range for a cron field!")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronSchedule:
+    """
+    A five field cron expression, "minute hour day-of-month month day-of-week", such as "0 18 * * mon,thu".
+    Fields can be *, numbers, ranges, lists and steps. Like cron, if both the day of month and the day of week
+    are restricted, a day matching either one matches.
+    """
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"\"{expression}\" does not have 5 fields!")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            parse_field(field, *FIELD_RANGES[i]) for i, field in enumerate(fields)
+        ]
+        if 7 in self.weekdays:
+            self.weekdays.add(0)
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def matches(self, time: datetime.datetime) -> bool:
+        if time.minute not in self.minutes or time.hour not in self.hours or time.month not in self.months:
+            return False
+        day = time.day in self.days
+        weekday = (time.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
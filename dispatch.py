@@ -0,0 +1,163 @@
+import asyncio
+import collections
+import time
+
+import discord
+
+from metrics import metrics
+from render import MESSAGE_LIMIT
+
+# Discord allows about 5 messages per 5 seconds to one channel or interaction, and 50 requests a second overall.
+ROUTE_RATE = 5
+ROUTE_PERIOD = 5.0
+GLOBAL_RATE = 50
+GLOBAL_PERIOD = 1.0
+# How many times a message is retried after a 429.
+MAX_RETRIES = 3
+# Idle routes are forgotten once there are more than this many.
+MAX_IDLE_ROUTES = 256
+
+
+def chunk_message(content: str, limit: int = MESSAGE_LIMIT) -> list[str]:
+    """
+    Splits a message into messages of at most `limit` characters, between lines so that no mention is cut in half.
+    Lines longer than the limit are split wherever they have to be.
+    """
+    chunks = []
+    chunk = ""
+    for line in content.splitlines(keepends=True):
+        while len(line) > limit:
+            if chunk:
+                chunks.append(chunk)
+                chunk = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(chunk) + len(line) > limit:
+            chunks.append(chunk)
+            chunk = ""
+        chunk += line
+    chunks.append(chunk)
+    # Discord won't send a blank message.
+    return [chunk for chunk in chunks if chunk.strip()]
+
+
+class RateBucket:
+    """
+    Lets at most `rate` sends through every `period` seconds, and holds everything back while paused after a 429.
+    """
+
+    def __init__(self, rate: int, period: float):
+        self.rate = rate
+        self.period = period
+        self.sent = collections.deque()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                while self.sent and now - self.sent[0] >= self.period:
+                    self.sent.popleft()
+                wait = self.paused_until - now
+                if len(self.sent) >= self.rate:
+                    wait = max(wait, self.sent[0] + self.period - now)
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.sent.append(time.monotonic())
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+
+def get_retry_after(error: discord.HTTPException) -> float:
+    headers = getattr(error.response, "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After", 1.0))
+    except ValueError:
+        return 1.0
+
+
+class MessageDispatcher:
+    """
+    Sends messages of any length: they are split at Discord's size limit and each route (a channel, an
+    interaction's followups or DMs) is paced to stay under its rate limit. A 429 pauses the route for as long as
+    Discord asks and the message is sent again.
+    """
+
+    def __init__(self, route_rate: int = ROUTE_RATE, route_period: float = ROUTE_PERIOD):
+        self.route_rate = route_rate
+        self.route_period = route_period
+        self.buckets: dict[tuple, RateBucket] = {}
+        self.global_bucket = RateBucket(GLOBAL_RATE, GLOBAL_PERIOD)
+
+    def get_bucket(self, route: tuple) -> RateBucket:
+        if route not in self.buckets:
+            self.buckets[route] = RateBucket(self.route_rate, self.route_period)
+        return self.buckets[route]
+
+    async def send(self, route: tuple, send, content: str) -> int:
+        """
+        Sends a message in as many parts as it takes.
+        :param route: What the rate limit applies to, such as ("channel", channel id).
+        :param send: A coroutine function that sends one part, given its content.
+        :param content: The message.
+        :return: How many parts were sent.
+        """
+        bucket = self.get_bucket(route)
+        chunks = chunk_message(content)
+        for chunk in chunks:
+            for attempt in range(MAX_RETRIES + 1):
+                await bucket.acquire()
+                await self.global_bucket.acquire()
+                try:
+                    await send(chunk)
+                    break
+                except discord.HTTPException as error:
+                    if error.status != 429 or attempt == MAX_RETRIES:
+                        raise
+                    metrics.increment("rate_limited_total", route=route[0])
+                    bucket.pause(get_retry_after(error))
+            metrics.increment("messages_sent_total", route=route[0])
+        if len(self.buckets) > MAX_IDLE_ROUTES:
+            self.forget_idle_routes()
+        return len(chunks)
+
+    def forget_idle_routes(self):
+        """
+        Drops the buckets of routes that haven't been used for a whole period, there is one per interaction.
+        """
+        now = time.monotonic()
+        for route, bucket in list(self.buckets.items()):
+            idle = not bucket.sent or now - bucket.sent[-1] >= bucket.period
+            if idle and bucket.paused_until <= now and not bucket.lock.locked():
+                del self.buckets[route]
+
+    async def respond(self, ctx: discord.ApplicationContext, content: str) -> int:
+        """
+        Answers an interaction. The first part is the response and the rest are followups.
+        """
+        return await self.send(("interaction", ctx.interaction.id), ctx.respond, content)
+
+    async def send_to_channel(self, channel: discord.abc.Messageable, content: str) -> int:
+        return await self.send(("channel", channel.id), channel.send, content)
+
+    async def send_dms(self, client: discord.Client, user_ids, content: str) -> tuple[int, int]:
+        """
+        Sends a message to each user. Users that can't be found or that don't accept DMs are skipped.
+        :return: (how many users got it, how many didn't).
+        """
+        delivered = failed = 0
+        for user_id in user_ids:
+            try:
+                user = await client.get_or_fetch(discord.User, user_id)
+                if user is None:
+                    failed += 1
+                    continue
+                # Every DM channel is its own route, the global limit paces a wave of them.
+                await self.send(("dm", user_id), user.send, content)
+                delivered += 1
+            except (discord.Forbidden, discord.NotFound):
+                failed += 1
+        return delivered, failed
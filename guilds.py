@@ -0,0 +1,151 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from analytics import PracticeAnalytics
+from async_logmanager import TEAMS_KEY, AsyncLogManager
+from autocomplete import PrefixIndex
+from logmanager import DATA_ROOT, LogManager
+from remote import SOCKET_ENV, RemoteAnalytics, RemoteLogManager, StorageClient
+from render import RenderCache, Rendered, render_json
+from violations import ViolatorReport
+
+
+def get_data_roots(data_root: str = DATA_ROOT) -> list[str]:
+    """
+    Lists where every partition's data is, for scripts that work on all of it.
+    :return: data_root, then {data_root}guilds/{guild id}/ for every guild with data.
+    """
+    roots = [data_root] if os.path.isdir(data_root) else []
+    guilds_dir = data_root + "guilds/"
+    if os.path.isdir(guilds_dir):
+        with os.scandir(guilds_dir) as entries:
+            roots += sorted(f"{guilds_dir}{entry.name}/" for entry in entries if entry.is_dir())
+    return roots
+
+
+class GuildPartition:
+    """
+    Everything kept for one guild: its LogManager, with its own storage, caches and locks, and the indexes and
+    reports built over it.
+    """
+
+    def __init__(self, guild_id: int, logger, analytics, executor: ThreadPoolExecutor, max_running: int = None):
+        """
+        :param logger: The guild's LogManager, or a RemoteLogManager for it.
+        :param analytics: The guild's PracticeAnalytics, or a RemoteAnalytics for it.
+        :param max_running: Optional: the most threads of the shared pool the guild may use at once.
+        """
+        self.guild_id = guild_id
+        self.logger = logger
+        # Commands go through this so that LogManager's disk I/O runs off the event loop.
+        self.async_logger = AsyncLogManager(self.logger, executor=executor, max_running=max_running)
+        self.violator_report = ViolatorReport(self.async_logger)
+        self.analytics = analytics
+        self.team_name_index = PrefixIndex(loader=lambda: self.logger.team_name_to_id.keys())
+        self.teams_render = RenderCache("team_render")
+        self.loaded = False
+
+    async def load(self) -> "GuildPartition":
+        """
+        Reads the guild's teams and builds its team name index in the thread pool, the first time. Opening the
+        storage recovers its journal and seals, which must not happen on the event loop.
+        :return: The partition, ready to use.
+        """
+        if not self.loaded:
+            await self.async_logger.run(TEAMS_KEY, self.team_name_index.load)
+            self.loaded = True
+        return self
+
+    def render_teams(self) -> Rendered:
+        """
+        Renders every team for /team all, again only when a team has changed. Call this under TEAMS_KEY.
+        """
+        return self.teams_render.get(
+            self.logger.teams_version,
+            lambda: render_json(self.logger.teams, "teams.json", self.logger.team_info)
+        )
+
+    def close(self):
+        self.async_logger.shutdown()
+        self.logger.close()
+
+
+class GuildPartitions:
+    """
+    One GuildPartition per guild, created the first time the guild uses the bot.
+
+    Each guild's data lives in {data_root}guilds/{guild id}/. The home guild, and commands used outside of a
+    guild, keep using data_root itself so that data from before partitioning stays where it is. If there is
+    data from before partitioning (teams.json but no guilds/ directory) and no home guild is set, every guild
+    keeps sharing data_root.
+    Every partition shares one thread pool, but a guild's locks only ever wait on that guild's work, and a guild
+    can only take half of the threads so that one guild's big export or import can't hold up the others.
+
+    Given a StorageClient, the partitions are served by a storage_server.py process instead, so that several
+    bot processes can share them. The server does the partitioning then.
+    """
+
+    def __init__(
+            self,
+            data_root: str = DATA_ROOT,
+            home_guild_id: int = None,
+            max_workers: int = 8,
+            client: StorageClient = None
+    ):
+        self.data_root = data_root
+        self.home_guild_id = home_guild_id
+        self.client = client
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="logmanager")
+        self.guild_workers = max(1, max_workers // 2)
+        self.shared = home_guild_id is None and client is None and os.path.exists(data_root + "teams.json") \
+            and not os.path.isdir(data_root + "guilds/")
+        if self.shared:
+            print(
+                f"Every server is sharing the teams in \"{data_root}\". Set UAH_ESPORTS_HOME_GUILD to the id of "
+                f"the server they belong to, to give the other servers their own."
+            )
+        self.partitions: dict[int, GuildPartition] = {}
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "GuildPartitions":
+        """
+        Reads the home guild from UAH_ESPORTS_HOME_GUILD, and connects to a storage server if
+        UAH_ESPORTS_STORAGE_SOCKET is set.
+        """
+        home_guild_id = os.getenv("UAH_ESPORTS_HOME_GUILD")
+        return cls(
+            home_guild_id=int(home_guild_id) if home_guild_id else None,
+            client=StorageClient.from_env() if os.getenv(SOCKET_ENV) else None
+        )
+
+    def get_data_root(self, guild_id: int) -> str:
+        if guild_id is None or guild_id == self.home_guild_id or self.shared:
+            return self.data_root
+        return f"{self.data_root}guilds/{guild_id}/"
+
+    def get(self, guild_id: int) -> GuildPartition:
+        if guild_id == self.home_guild_id or self.shared:
+            guild_id = None
+        if guild_id not in self.partitions:
+            with self.lock:
+                if guild_id not in self.partitions:
+                    self.partitions[guild_id] = self.create_partition(guild_id)
+        return self.partitions[guild_id]
+
+    def create_partition(self, guild_id: int) -> GuildPartition:
+        if self.client is not None:
+            logger, analytics = RemoteLogManager(self.client, guild_id), RemoteAnalytics(self.client, guild_id)
+        else:
+            logger = LogManager(data_root=self.get_data_root(guild_id))
+            analytics = PracticeAnalytics(logger)
+        return GuildPartition(guild_id, logger, analytics, self.executor, self.guild_workers)
+
+    def __iter__(self):
+        return iter(list(self.partitions.values()))
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        for partition in self:
+            partition.close()
@@ -0,0 +1,253 @@
+import json, os
+import threading
+import time
+
+from metrics import metrics
+from records import LogEntry
+
+
+class PendingWrite:
+    __slots__ = ("team_id", "rows", "done", "error")
+
+    def __init__(self, team_id: int, rows: list[LogEntry]):
+        self.team_id = team_id
+        self.rows = rows
+        self.done = threading.Event()
+        self.error: Exception = None
+
+
+class LogJournal:
+    """
+    An append-only write-ahead journal for log entries.
+
+    append() returns once the rows are fsynced to the journal. Concurrent appends are group committed: the
+    writer thread takes everything queued since its last fsync and commits it with a single fsync.
+    A compactor thread periodically folds the journal into the per-team logs of `store`, which must provide
+    has_log(team_id), ensure_current_format(team_id), log_size(team_id), truncate_log(team_id, size) and
+    write_logs(team_id, rows).
+
+    Compaction renames the journal to {path}.compacting and records every team log's size in
+    {path}.manifest before touching them, so that a crash part way through can be rolled back and replayed.
+    """
+
+    def __init__(self, path: str, store, compact_threshold: int = 256, compact_interval: float = 30.0):
+        self.path = path
+        self.compacting_path = path + ".compacting"
+        self.manifest_path = path + ".manifest"
+        self.store = store
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+
+        # Guards the queue of writes waiting for the next group commit.
+        self.lock = threading.Condition()
+        # Guards the journal file and the in-memory copies of uncompacted rows.
+        self.file_lock = threading.RLock()
+        # Held for a whole compaction, so that only one runs at a time.
+        self.fold_lock = threading.RLock()
+        # A team's lock is held while its rows move from the journal into its log, so that readers holding it
+        # never see them twice. Teams are folded one at a time and readers of the others don't wait.
+        self.team_locks: dict[int, threading.RLock] = {}
+        self.team_locks_lock = threading.Lock()
+        self.queue: list[PendingWrite] = []
+        self.uncompacted: dict[int, list[LogEntry]] = {}
+        self.compacting: dict[int, list[LogEntry]] = {}
+        # Teams whose compacting rows are already in their log.
+        self.folded: set = set()
+        self.uncompacted_count = 0
+        self.closed = False
+
+        self.recover()
+        self.file = open(self.path, "a")
+
+        self.compact_requested = threading.Event()
+        self.writer = threading.Thread(target=self.write_loop, name="journal-writer", daemon=True)
+        self.compactor = threading.Thread(target=self.compact_loop, name="journal-compactor", daemon=True)
+        self.writer.start()
+        self.compactor.start()
+
+    @staticmethod
+    def read_entries(path: str) -> dict[int, list[LogEntry]]:
+        entries = {}
+        if not os.path.exists(path):
+            return entries
+        with open(path, "r") as file:
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A torn write from a crash. Nothing after it was acknowledged.
+                    break
+                row = entry["row"]
+                # Journals from before the typed log format hold version 1 rows.
+                entries.setdefault(entry["team_id"], []).append(
+                    LogEntry.from_row(row) if isinstance(row, dict) else LogEntry.from_list(row)
+                )
+        return entries
+
+    def team_lock(self, team_id: int) -> threading.RLock:
+        with self.team_locks_lock:
+            if team_id not in self.team_locks:
+                self.team_locks[team_id] = threading.RLock()
+            return self.team_locks[team_id]
+
+    def rollback(self):
+        """
+        Undoes a fold that was interrupted part way, using the sizes recorded in the manifest.
+        """
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as file:
+                for team_id, size in json.load(file).items():
+                    with self.team_lock(int(team_id)):
+                        self.store.truncate_log(int(team_id), size)
+                        with self.file_lock:
+                            self.folded.discard(int(team_id))
+
+    def recover(self):
+        """
+        Folds whatever a previous process left in the journal into the team logs.
+        """
+        if os.path.exists(self.compacting_path):
+            self.rollback()
+            self.fold(self.read_entries(self.compacting_path))
+        elif os.path.exists(self.manifest_path):
+            os.unlink(self.manifest_path)
+
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            os.replace(self.path, self.compacting_path)
+            self.fold(self.read_entries(self.compacting_path))
+        # Nothing reads rows from a recovered journal, they were never in compacting.
+        with self.file_lock:
+            self.folded = set()
+
+    def fold(self, entries: dict[int, list[LogEntry]]):
+        """
+        Writes entries from {path}.compacting into the team logs and then removes it.
+        """
+        # Team logs from before the typed format are converted first, so that the manifest has their new sizes.
+        for team_id in entries:
+            if self.store.has_log(team_id):
+                self.store.ensure_current_format(team_id)
+        with open(self.manifest_path + ".tmp", "w") as file:
+            json.dump({team_id: self.store.log_size(team_id) for team_id in entries if self.store.has_log(team_id)}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(self.manifest_path + ".tmp", self.manifest_path)
+
+        for team_id, rows in entries.items():
+            if not self.store.has_log(team_id):
+                print(f"Dropping {len(rows)} journaled logs for missing team id: \"{team_id}\"!")
+                continue
+            with self.team_lock(team_id):
+                self.store.write_logs(team_id, rows)
+                with self.file_lock:
+                    self.folded.add(team_id)
+
+        os.unlink(self.compacting_path)
+        os.unlink(self.manifest_path)
+
+    def append(self, team_id: int, rows: list[LogEntry]):
+        """
+        Adds entries to the journal and waits until they are durable.
+        :param team_id: The id of the team the entries belong to.
+        :param rows: The log entries.
+        """
+        write = PendingWrite(team_id, rows)
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("The log journal is closed!")
+            self.queue.append(write)
+            self.lock.notify_all()
+        write.done.wait()
+        if write.error is not None:
+            raise write.error
+
+    def write_loop(self):
+        while True:
+            with self.lock:
+                while not self.queue and not self.closed:
+                    self.lock.wait()
+                if not self.queue:
+                    return
+                batch, self.queue = self.queue, []
+
+            # Appends that arrive while this batch is being fsynced queue up for the next one.
+            with self.file_lock:
+                start = time.perf_counter()
+                try:
+                    data = "".join(
+                        json.dumps({"team_id": write.team_id, "row": row.to_list()}) + "\n" for write in batch for row in write.rows
+                    )
+                    self.file.write(data)
+                    self.file.flush()
+                    os.fsync(self.file.fileno())
+                    metrics.increment("bytes_written_total", len(data), kind="journal")
+                    metrics.observe("journal_commit_seconds", time.perf_counter() - start)
+                    for write in batch:
+                        self.uncompacted.setdefault(write.team_id, []).extend(write.rows)
+                        self.uncompacted_count += len(write.rows)
+                    # Against the count of journal_commit_seconds, shows how many entries each fsync covered.
+                    metrics.increment("journal_entries_total", sum(len(write.rows) for write in batch))
+                except Exception as e:
+                    for write in batch:
+                        write.error = e
+
+                if self.uncompacted_count >= self.compact_threshold:
+                    self.compact_requested.set()
+
+            for write in batch:
+                write.done.set()
+
+    def compact_loop(self):
+        while not self.closed:
+            self.compact_requested.wait(self.compact_interval)
+            self.compact_requested.clear()
+            if not self.closed:
+                try:
+                    self.compact()
+                except Exception as e:
+                    print(f"Log journal compaction failed: {e}")
+
+    def compact(self):
+        """
+        Folds everything committed so far into the team logs.
+        """
+        with self.fold_lock:
+            if self.compacting:
+                # The last fold failed part way, finish it before starting another.
+                self.rollback()
+            else:
+                with self.file_lock:
+                    if not self.uncompacted:
+                        return
+                    self.file.close()
+                    os.replace(self.path, self.compacting_path)
+                    self.file = open(self.path, "a")
+                    self.compacting, self.uncompacted = self.uncompacted, {}
+                    self.uncompacted_count = 0
+
+            # Readers stop using the compacting rows of each team as soon as it is folded. Once every team is,
+            # the rows and the folded marks go together, so that no reader sees the rows in both places.
+            self.fold(self.compacting)
+            with self.file_lock:
+                self.compacting = {}
+                self.folded = set()
+
+    def pending_rows(self, team_id: int) -> list[LogEntry]:
+        """
+        Returns the rows for a team that are in the journal but not yet in its log. Hold team_lock(team_id) while
+        reading the team's log and calling this.
+        """
+        with self.file_lock:
+            compacting = [] if team_id in self.folded else self.compacting.get(team_id, [])
+            return compacting + self.uncompacted.get(team_id, [])
+
+    def close(self):
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            self.lock.notify_all()
+        self.compact_requested.set()
+        self.writer.join()
+        self.compact()
+        self.file.close()
@@ -0,0 +1,243 @@
+import argparse
+import asyncio
+import datetime
+import json
+import random
+import shutil
+import tempfile
+import time
+from types import SimpleNamespace
+
+import practice_log_cog
+from benchmark import generate
+from guilds import GuildPartitions
+
+# Replays interactions against the real command coroutines in practice_log_cog, with stand-ins for Discord's
+# contexts, and measures how long each takes to be acknowledged and answered and how far the event loop lags.
+# Streams are synthetic unless --replay gives a JSON lines file of {"at", "command", "options", "user"} events,
+# and --record saves the synthetic stream in that format. Events with a "guild" come from that server.
+# Usage: python loadtest.py [--rate 50] [--seconds 20] [--concurrency 32] [--replay stream.jsonl]
+
+# Discord drops an interaction that isn't acknowledged within this many seconds.
+INTERACTION_DEADLINE = 3.0
+# Relative frequency of each command in a synthetic stream.
+COMMAND_MIX = {
+    "practice": 40,
+    "scrim": 20,
+    "autocomplete": 25,
+    "add_player": 5,
+    "snitch": 5,
+    "get_mega_log": 5
+}
+
+
+class FakeInteraction:
+    def __init__(self, guild_id: int):
+        self.id = random.getrandbits(63)
+        self.guild_id = guild_id
+
+
+class FakeApplicationContext:
+    """
+    Stands in for discord.ApplicationContext. It records when the interaction was first acknowledged, by a
+    response or a defer, and when it was last responded to.
+    """
+
+    def __init__(self, user_id: int, guild_id: int = None):
+        self.interaction = FakeInteraction(guild_id)
+        self.author = SimpleNamespace(id=user_id, name=f"user{user_id % 10000}")
+        self.guild = SimpleNamespace(id=guild_id, filesize_limit=25 * 1024 * 1024) if guild_id else None
+        self.guild_id = guild_id
+        self.start = time.perf_counter()
+        self.acknowledged: float = None
+        self.responded: float = None
+        self.responses = []
+
+    def acknowledge(self):
+        if self.acknowledged is None:
+            self.acknowledged = time.perf_counter() - self.start
+
+    async def defer(self, *args, **kwargs):
+        self.acknowledge()
+
+    async def respond(self, content=None, **kwargs):
+        self.acknowledge()
+        self.responded = time.perf_counter() - self.start
+        self.responses.append(content if content is not None else kwargs)
+
+
+class FakeAutocompleteContext:
+    def __init__(self, value: str, guild_id: int = None):
+        self.interaction = FakeInteraction(guild_id)
+        self.value = value
+        self.options = {}
+
+
+def synthesize(team_list: list[dict], rate: float, seconds: float, seed: int = 0) -> list[dict]:
+    """
+    Generates a stream of interactions arriving as a Poisson process.
+    :param rate: Interactions per second, on average.
+    :param seconds: How long the stream lasts.
+    :return: The events, in order of arrival.
+    """
+    rng = random.Random(seed)
+    commands, weights = list(COMMAND_MIX), list(COMMAND_MIX.values())
+    today = datetime.date.today()
+    events = []
+    at = rng.expovariate(rate)
+    while at < seconds:
+        team = rng.choice(team_list)
+        user = rng.choice(team["players"])
+        command = rng.choices(commands, weights)[0]
+        date = today - datetime.timedelta(rng.randrange(10))
+        if command in ["practice", "scrim"]:
+            options = {
+                "date_of": f"{date.month}/{date.day}",
+                "duration": float(rng.randint(1, 3)),
+                "unit": "hours",
+                "result": "N/A" if command == "practice" else rng.choice(["Win", "Loss"]),
+                "team_name": team["team_name"]
+            }
+            if command == "scrim":
+                options["opponent_name"] = "UAB"
+        elif command == "autocomplete":
+            options = {"value": team["team_name"][:rng.randint(0, 6)]}
+        elif command == "add_player":
+            options = {"player": rng.randrange(10 ** 17, 10 ** 18), "team_name": team["team_name"]}
+        else:
+            options = {}
+        events.append({"at": at, "command": command, "options": options, "user": user})
+        at += rng.expovariate(rate)
+    return events
+
+
+async def play(event: dict) -> tuple[float, float]:
+    """
+    Runs one interaction.
+    :return: (seconds until acknowledged, seconds until responded).
+    """
+    if event["command"] == "autocomplete":
+        start = time.perf_counter()
+        await practice_log_cog.get_team_names(FakeAutocompleteContext(event["options"]["value"], event.get("guild")))
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed
+
+    ctx = FakeApplicationContext(event["user"], event.get("guild"))
+    command = getattr(practice_log_cog, event["command"])
+    await command.callback(ctx, **event["options"])
+    return ctx.acknowledged, ctx.responded
+
+
+async def monitor_lag(lags: list[float], stopped: asyncio.Event, interval: float = 0.01):
+    """
+    Measures how late the event loop wakes up from a short sleep, which is how long it was busy.
+    """
+    while not stopped.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+
+
+async def replay(events: list[dict], concurrency: int) -> tuple[dict, list[float]]:
+    """
+    Plays events at the time they arrive, with at most `concurrency` interactions running at once.
+    :return: (a dict of command to a list of (acknowledged, responded, waited) timings, event loop lags).
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    timings: dict[str, list] = {}
+    lags = []
+    stopped = asyncio.Event()
+    lag_monitor = asyncio.create_task(monitor_lag(lags, stopped))
+
+    async def run(event):
+        arrived = time.perf_counter()
+        async with semaphore:
+            waited = time.perf_counter() - arrived
+            try:
+                acknowledged, responded = await play(event)
+            except Exception as error:
+                timings.setdefault("errors", []).append(repr(error))
+                return
+        # Time spent waiting for a free slot counts, Discord's deadline starts when the interaction arrives.
+        timings.setdefault(event["command"], []).append((
+            None if acknowledged is None else waited + acknowledged,
+            None if responded is None else waited + responded
+        ))
+
+    start = time.perf_counter()
+    tasks = []
+    for event in events:
+        delay = event["at"] - (time.perf_counter() - start)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(run(event)))
+    await asyncio.gather(*tasks)
+    stopped.set()
+    await lag_monitor
+    return timings, lags
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else float("nan")
+
+
+def report(timings: dict, lags: list[float], seconds: float):
+    errors = timings.pop("errors", [])
+    print(f"{'Command':<14} {'Count':>6} {'ack p50':>8} {'ack p99':>8} {'resp p50':>9} {'resp p99':>9} {'max':>7} {'late':>5}")
+    for command, results in sorted(timings.items()):
+        acknowledged = [ack for ack, resp in results if ack is not None]
+        responded = [resp for ack, resp in results if resp is not None]
+        late = sum(1 for ack, resp in results if ack is None or ack > INTERACTION_DEADLINE)
+        print(
+            f"{command:<14} {len(results):>6} {percentile(acknowledged, 0.5) * 1000:>6.1f}ms "
+            f"{percentile(acknowledged, 0.99) * 1000:>6.1f}ms {percentile(responded, 0.5) * 1000:>7.1f}ms "
+            f"{percentile(responded, 0.99) * 1000:>7.1f}ms {max(responded, default=0):>6.2f}s {late:>5}"
+        )
+    total = sum(len(results) for results in timings.values())
+    print(f"\n{total / seconds:.1f} interactions/s, {len(errors)} errors")
+    print(
+        f"Event loop lag: p50 {percentile(lags, 0.5) * 1000:.1f}ms, p99 {percentile(lags, 0.99) * 1000:.1f}ms, "
+        f"max {max(lags, default=0) * 1000:.1f}ms"
+    )
+    for error in sorted(set(errors))[:5]:
+        print(f"Error: {error}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays interactions against the cog without Discord.")
+    parser.add_argument("--rate", type=float, default=50, help="Interactions per second.")
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--concurrency", type=int, default=32, help="Most interactions handled at once.")
+    parser.add_argument("--teams", type=int, default=40)
+    parser.add_argument("--years", type=float, default=2)
+    parser.add_argument("--per-week", type=float, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="A JSON lines stream to replay instead of a synthetic one.")
+    parser.add_argument("--record", help="Where to save the synthetic stream.")
+    args = parser.parse_args()
+
+    data_root = tempfile.mkdtemp(prefix="loadtest_") + "/"
+    try:
+        team_list = generate(data_root, args.teams, args.years, args.per_week, args.seed)
+        if args.replay:
+            with open(args.replay, "r") as file:
+                events = [json.loads(line) for line in file if line.strip()]
+        else:
+            events = synthesize(team_list, args.rate, args.seconds, args.seed)
+        if args.record:
+            with open(args.record, "w") as file:
+                file.writelines(json.dumps(event) + "\n" for event in events)
+
+        practice_log_cog.partitions = GuildPartitions(data_root=data_root)
+        start = time.perf_counter()
+        timings, lags = asyncio.run(replay(events, args.concurrency))
+        elapsed = time.perf_counter() - start
+        practice_log_cog.partitions.close()
+        report(timings, lags, elapsed)
+    finally:
+        shutil.rmtree(data_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+import csv
+import datetime
+import io
+
+from records import LogEntry, Unit, parse_length
+
+# The most rows and bytes one import can have.
+MAX_IMPORT_ROWS = 10000
+MAX_IMPORT_BYTES = 5 * 1024 * 1024
+# Columns an import can have. "length" (e.g. "2 hours" or "best-of-5", like exports have) can stand in for
+# "duration" and "unit", and "team" is a team name or id.
+IMPORT_COLUMNS = ["date", "duration", "unit", "length", "type", "result", "opponent", "team"]
+
+
+def parse_log_date(text: str, today: datetime.date) -> datetime.date:
+    """
+    Reads a date the way /log practice does: month/day is this year, or last year if that would be in the future.
+    Month/day/year is also accepted.
+    """
+    parts = text.strip().split("/")
+    if len(parts) == 2:
+        date = datetime.date(today.year, int(parts[0]), int(parts[1]))
+        return date if date <= today else date.replace(year=today.year - 1)
+    if len(parts) == 3:
+        return datetime.date(int(parts[2]), int(parts[0]), int(parts[1]))
+    raise ValueError
+
+
+class LogImport:
+    """
+    Reads and checks every row of an uploaded log in one pass, so that the accepted rows can be written with one
+    append per team.
+    """
+
+    def __init__(self, team_name_to_id: dict[str, int], team_ids, log_types: list[str], results: list[str]):
+        """
+        :param team_name_to_id: The guild's team names.
+        :param team_ids: The guild's team ids.
+        :param log_types: The allowed log types.
+        :param results: The allowed results.
+        """
+        self.team_name_to_id = team_name_to_id
+        self.team_ids = team_ids
+        self.log_types = {log_type.lower(): log_type for log_type in log_types}
+        self.results = {result.lower(): result for result in results}
+        self.entries: dict[int, list[LogEntry]] = {}
+        self.errors: list[str] = []
+        self.row_count = 0
+
+    def get_team_id(self, team: str, default_team_id: int) -> int:
+        if not team:
+            if default_team_id is None:
+                raise ValueError("no team given, and the command user isn't on exactly one team")
+            return default_team_id
+        if team in self.team_name_to_id:
+            return self.team_name_to_id[team]
+        if team.isdigit() and int(team) in self.team_ids:
+            return int(team)
+        raise ValueError(f"cannot find team \"{team}\"")
+
+    def parse_row(self, row: dict, default_team_id: int, submitted_by: str, today: datetime.date) -> tuple[int, LogEntry]:
+        try:
+            date = parse_log_date(row.get("date") or "", today)
+        except ValueError:
+            raise ValueError("date must be formatted as month/day or month/day/year")
+        if date > today:
+            raise ValueError("date is in the future")
+
+        if row.get("length"):
+            duration, unit = parse_length(row["length"])
+        else:
+            try:
+                duration = float(row.get("duration") or "")
+            except ValueError:
+                raise ValueError("duration must be an int or float")
+            unit = Unit.from_label(row.get("unit") or "")
+        if unit == Unit.UNKNOWN:
+            raise ValueError(f"unit must be one of: {', '.join(option.label for option in Unit if option != Unit.UNKNOWN)}")
+        if not 0 < duration < float("inf"):
+            raise ValueError("duration must be more than 0")
+
+        log_type = self.log_types.get((row.get("type") or "Practice").strip().lower())
+        if log_type is None:
+            raise ValueError(f"type must be one of: {', '.join(self.log_types.values())}")
+        result = self.results.get((row.get("result") or "N/A").strip().lower())
+        if result is None:
+            raise ValueError(f"result must be one of: {', '.join(self.results.values())}")
+
+        opponent = (row.get("opponent") or "").strip()
+        if not opponent.isprintable():
+            raise ValueError("opponent can't have line breaks or other control characters")
+
+        team_id = self.get_team_id((row.get("team") or "").strip(), default_team_id)
+        entry = LogEntry(
+            date.toordinal(), duration, unit, log_type, today.toordinal(), submitted_by, result, opponent
+        )
+        return team_id, entry
+
+    def read(self, text: str, default_team_id: int, submitted_by: str, today: datetime.date = None):
+        """
+        Reads a CSV with a header row of IMPORT_COLUMNS, in any order and case. Unknown columns are ignored.
+        Accepted rows are added to `entries` by team id, and rejected ones to `errors`.
+        :param text: The CSV.
+        :param default_team_id: The team of rows without a team, or None if they must have one.
+        :param submitted_by: Who is importing the logs.
+        :param today: Optional: the date to check dates against and to record as the submission date.
+        """
+        today = today or datetime.date.today()
+        reader = csv.reader(io.StringIO(text, newline=""))
+        header = next(reader, None)
+        if header is None:
+            self.errors.append("The file is empty.")
+            return
+        columns = [column.strip().lower() for column in header]
+        if "date" not in columns or not ("length" in columns or {"duration", "unit"} <= set(columns)):
+            self.errors.append(f"The first line must name the columns, out of: {', '.join(IMPORT_COLUMNS)}.")
+            return
+
+        # Line 1 is the header.
+        for line, values in enumerate(reader, start=2):
+            if not any(value.strip() for value in values):
+                continue
+            self.row_count += 1
+            if self.row_count > MAX_IMPORT_ROWS:
+                self.errors.append(f"Line {line}: stopped, an import can have at most {MAX_IMPORT_ROWS} rows.")
+                return
+            try:
+                team_id, entry = self.parse_row(dict(zip(columns, values)), default_team_id, submitted_by, today)
+            except ValueError as e:
+                self.errors.append(f"Line {line}: {e}.")
+                continue
+            self.entries.setdefault(team_id, []).append(entry)
+
+    @property
+    def accepted_count(self) -> int:
+        return sum(len(entries) for entries in self.entries.values())
@@ -0,0 +1,149 @@
+import csv
+import io
+import json
+import os
+import threading
+
+from metrics import metrics
+from records import LOG_FORMAT_LINE, LogEntry
+
+# How many rows each block of the index covers.
+BLOCK_ROWS = 64
+
+
+def read_rows(file):
+    """
+    Yields the raw bytes of each CSV row in a binary file. A quoted field can have line breaks in it, so lines are
+    joined until their quotes are balanced. The last row is yielded as is even if it is incomplete.
+    """
+    row = b""
+    for line in file:
+        row += line
+        if row.count(b'"') % 2 == 0:
+            yield row
+            row = b""
+    if row:
+        yield row
+
+
+class SparseLogIndex:
+    """
+    A sidecar index over a version 2 log file, for reading a date range without parsing the whole file.
+
+    The file is split into blocks of BLOCK_ROWS rows in file order, and each block records its byte offset and
+    the earliest and latest date in it. Logs are in the order they were logged, not by date, so a late entry
+    only widens its block's range. A range query seeks to each block whose range overlaps and decodes just
+    those rows.
+
+    The index remembers the inode and size of the file it covers. Rows appended since are indexed on the next
+    use, and a file that was replaced or truncated is indexed from scratch.
+    """
+
+    def __init__(self, log_path: str, index_path: str):
+        self.log_path = log_path
+        self.index_path = index_path
+        self.lock = threading.Lock()
+        # [offset, first date, last date, rows] for every block.
+        self.blocks: list[list[int]] = None
+        self.inode: int = None
+        self.size = 0
+
+    def load(self):
+        if os.path.exists(self.index_path):
+            with open(self.index_path, "r") as file:
+                index = json.load(file)
+            if index.get("block_rows") == BLOCK_ROWS:
+                self.blocks = index["blocks"]
+                self.inode = index["inode"]
+                self.size = index["size"]
+                return
+        self.blocks = []
+        self.inode = None
+        self.size = 0
+
+    def save(self):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as file:
+            json.dump({"block_rows": BLOCK_ROWS, "inode": self.inode, "size": self.size, "blocks": self.blocks}, file)
+        os.replace(temp_path, self.index_path)
+
+    def invalidate(self):
+        """
+        Forgets the index, for when the file is about to be changed other than by appending.
+        """
+        with self.lock:
+            self.blocks = []
+            self.inode = None
+            self.size = 0
+            if os.path.exists(self.index_path):
+                os.unlink(self.index_path)
+
+    def update(self):
+        """
+        Brings the index up to date with the file, indexing only what was appended since it was last used.
+        """
+        with self.lock:
+            if self.blocks is None:
+                self.load()
+            stat = os.stat(self.log_path)
+            if stat.st_ino != self.inode or stat.st_size < self.size:
+                self.blocks = []
+                self.inode = stat.st_ino
+                self.size = 0
+            if stat.st_size == self.size:
+                return
+
+            with open(self.log_path, "rb") as file:
+                file.seek(self.size)
+                if self.size == 0:
+                    # Skip the format line and the header.
+                    if file.readline().rstrip(b"\r\n").decode() != LOG_FORMAT_LINE:
+                        raise ValueError(f"Only version 2 logs can be indexed: \"{self.log_path}\"")
+                    file.readline()
+                offset = file.tell()
+                metrics.record_read("log_index", stat.st_size - offset)
+                for row in read_rows(file):
+                    if not row.endswith(b"\n"):
+                        # A row still being written, it is indexed next time.
+                        break
+                    if row.strip():
+                        # The date comes first and is never quoted.
+                        date = int(row.split(b",", 1)[0])
+                        block = self.blocks[-1] if self.blocks else None
+                        if block is None or block[3] >= BLOCK_ROWS:
+                            self.blocks.append([offset, date, date, 1])
+                        else:
+                            block[1] = min(block[1], date)
+                            block[2] = max(block[2], date)
+                            block[3] += 1
+                    offset += len(row)
+            self.size = offset
+            self.save()
+
+    def read_range(self, start: int, end: int) -> list[LogEntry]:
+        """
+        Reads the entries dated between two days, in file order.
+        :param start: The first day, as an ordinal.
+        :param end: The last day, as an ordinal.
+        """
+        self.update()
+        with self.lock:
+            blocks = self.blocks + [[self.size]]
+            spans = [
+                (block[0], following[0]) for block, following in zip(blocks, blocks[1:])
+                if block[1] <= end and block[2] >= start
+            ]
+        entries = []
+        size = 0
+        with open(self.log_path, "rb") as file:
+            for block_start, block_end in spans:
+                file.seek(block_start)
+                data = file.read(block_end - block_start)
+                size += len(data)
+                for values in csv.reader(io.StringIO(data.decode(), newline="")):
+                    if values:
+                        entry = LogEntry.from_list(values)
+                        if start <= entry.date <= end:
+                            entries.append(entry)
+        metrics.record_read("log_range", size)
+        return entries
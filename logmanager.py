@@ -1,41 +1,171 @@
-import json, csv, os
+import collections
 import datetime
+import gzip
+import io
+import os
+import sys
+import threading
+import zipfile
+
+from columnar import build_team_table
+from megalog import MegaLog
+from metrics import metrics
+from records import LOG_HEADERS, LogEntry, Unit
+from storage import StorageBackend, create_storage, export_entries
+from team_registry import TeamRegistry
 
 DATA_ROOT = f"data/"
+MEGA_LOG_COMPRESSIONS = [None, "gzip", "zip"]
+
+
+class LogSummary:
+    """
+    A summary of a team's log: the first entry plus the latest entry of every log type.
+    Entries are stored as (position, entry) tuples so that ties can go to whichever entry was logged first.
+    """
+    __slots__ = ("first", "latest", "count")
+
+    def __init__(self, first: tuple = None, latest: dict = None, count: int = 0):
+        self.first = first
+        self.latest = latest if latest is not None else {}
+        self.count = count
+
+    def add(self, entry: LogEntry, position: int = None):
+        """
+        Folds a log entry into the summary.
+        :param entry: The log entry being added.
+        :param position: Optional: the position of the entry in the log. Defaults to the end of the log.
+        """
+        if position is None:
+            position = self.count
+        if self.first is None:
+            self.first = (position, entry)
+        latest = self.latest.get(entry.log_type)
+        if latest is None or entry.date > latest[1].date:
+            self.latest[entry.log_type] = (position, entry)
+        self.count = max(self.count, position + 1)
+
+    def most_recent(self, include_matches=False) -> LogEntry:
+        if self.first is None:
+            return None
+        # The first entry in the log is the fallback if no practices are newer than it.
+        most_recent = self.first
+        for log_type, (position, entry) in self.latest.items():
+            if not (log_type in ["Scrimmage", "Practice"] or include_matches):
+                continue
+            if entry.date > self.first[1].date and (entry.date, -position) > (most_recent[1].date, -most_recent[0]):
+                most_recent = (position, entry)
+        return most_recent[1]
+
+
+def estimate_size(entry: LogEntry) -> int:
+    """
+    Roughly how many bytes a log entry takes up in memory.
+    """
+    return sys.getsizeof(entry) + sum(
+        sys.getsizeof(text) for text in (entry.log_type, entry.submitted_by, entry.result, entry.opponent)
+    )
+
 
 class LogManager:
-    def __init__(self):
-        self.team_info: dict = json.load(self.open_read_file(DATA_ROOT + "teams.json", default_data={}))
-        self.headers = ["Date", "Length", "Type",  "Submitted On", "Submitted By", "Result", "Opponent"]
-
-        if "teams" not in self.team_info:
-            self.team_info["teams"] = []
-        self.teams: list = self.team_info["teams"]
-        self.team_name_to_id = {team["team_name"]: team["id"] for team in self.team_info["teams"]}
-        # Filling the player map
-        self.player_map = {}
-        for team in self.teams:
-            for player in team["players"]:
-                self.player_map[player] = team["id"]
-
-        self.teams_dir = f"{DATA_ROOT}teams/"
-        self.save()
+    def __init__(self, storage: StorageBackend = None, log_cache_bytes: int = None, data_root: str = DATA_ROOT):
+        """
+        Nothing is read until it is first needed, so creating a LogManager is free.
+        :param storage: Optional: the storage backend. Defaults to the one create_storage picks for data_root.
+        :param log_cache_bytes: Optional: roughly how much memory loaded logs may take up. Defaults to
+            UAH_ESPORTS_LOG_CACHE_MB megabytes, or 64.
+        :param data_root: Optional: the directory this manager's data lives in. Defaults to DATA_ROOT.
+        """
+        self.data_root = data_root
+        self.opened_storage = storage
+        self.loaded_team_info: dict = None
+        self.loaded_registry: TeamRegistry = None
+        self.load_lock = threading.Lock()
+        self.headers = LOG_HEADERS
+
+        # In-memory log index. Each team's log is read from storage when it is needed and then kept up to date
+        # by add_log. The least recently used logs are dropped once they go over the memory budget, summaries
+        # are small and are always kept.
+        if log_cache_bytes is None:
+            log_cache_bytes = int(float(os.getenv("UAH_ESPORTS_LOG_CACHE_MB", "64")) * 1024 * 1024)
+        self.log_cache_bytes = log_cache_bytes
+        self.logs: collections.OrderedDict[int, list] = collections.OrderedDict()
+        self.log_sizes: dict[int, int] = {}
+        self.logs_size = 0
+        self.logs_lock = threading.RLock()
+        self.summaries: dict[int, LogSummary] = {}
+
+        # Version counters for caching exports. teams_version changes on every team change and log_versions on
+        # every new log for that team.
+        self.teams_version = 0
+        self.log_versions: dict[int, int] = {}
+
+        self.mega_log = MegaLog(self.data_root + "mega_log.csv")
+        self.mega_log_cache: dict = {}
+        # Team id to (log version, team name, game, Arrow table) for columnar exports.
+        self.team_tables: dict[int, tuple] = {}
+
+    @property
+    def storage(self) -> StorageBackend:
+        if self.opened_storage is None:
+            with self.load_lock:
+                if self.opened_storage is None:
+                    self.opened_storage = create_storage(self.data_root)
+        return self.opened_storage
+
+    @metrics.timed("logmanager_seconds")
+    def load_teams(self) -> TeamRegistry:
+        """
+        Reads team info from storage, the first time it is called.
+        :return: The team registry.
+        """
+        if self.loaded_registry is None:
+            team_info = self.storage.load_team_info()
+            with self.load_lock:
+                if self.loaded_registry is None:
+                    if "teams" not in team_info:
+                        team_info["teams"] = []
+                    self.loaded_team_info = team_info
+                    self.loaded_registry = TeamRegistry(team_info["teams"])
+        return self.loaded_registry
+
+    @property
+    def registry(self) -> TeamRegistry:
+        return self.loaded_registry if self.loaded_registry is not None else self.load_teams()
+
+    @property
+    def team_info(self) -> dict:
+        if self.loaded_team_info is None:
+            self.load_teams()
+        return self.loaded_team_info
 
-    def save(self):
-        json.dump(self.team_info, open(DATA_ROOT + "teams.json", "w+"), indent=4)
-        print("Dumped teams")
-
-    def open_read_file(self, path, default_data=None):
-        print(os.listdir(path[:path.rfind("/")]))
-        if path[path.rfind("/") + 1:] in os.listdir(path[:path.rfind("/")]):
-            return open(path, "r")
-        else:
-            new_file = open(path, "w")
-            if default_data is not None:
-                json.dump(default_data, new_file, indent=4)
-            new_file.close()
-            return open(path, "r")
+    @property
+    def teams(self) -> list:
+        return self.registry.teams
 
+    # These are the registry's own indexes, kept up to date by it. player_map maps a player to a set of team ids.
+    @property
+    def team_name_to_id(self) -> dict[str, int]:
+        return self.registry.name_to_id
+
+    @property
+    def player_map(self) -> dict[int, set]:
+        return self.registry.player_teams
+
+    @metrics.timed("logmanager_seconds")
+    def save(self, flush: bool = False):
+        self.teams_version += 1
+        self.storage.save_team_info(self.team_info, flush)
+
+    def close(self):
+        """
+        Flushes anything the storage backend hasn't written yet. Call this before the bot exits.
+        """
+        self.mega_log.save()
+        if self.opened_storage is not None:
+            self.opened_storage.close()
+
+    @metrics.timed("logmanager_seconds")
     def create_team(self, team_name: str, id: str = None, player_ids: list[int] = None, game: str = None) -> int:
         """
         This function creates a team.
@@ -46,61 +176,44 @@ class LogManager:
         :return: The team id.
         """
         assert team_name
+        if team_name in self.team_name_to_id:
+            raise ValueError(f"There is already a team named: \"{team_name}\"!")
         if not id:
-            id = len(self.team_name_to_id)
-            while id in self.team_name_to_id.values():
-                id += 1
-        self.team_name_to_id[team_name] = id  # We must update this because it isn't updated when adding a team.
-        self.teams.append({
+            # Skips ids that have a log but no team, left behind by a crash while creating a team.
+            id = self.registry.next_id(in_use=self.storage.has_log)
+        elif id in self.registry:
+            raise ValueError(f"There is already a team with team id: \"{id}\"!")
+        # The team is only registered once it has a log, so a failure here leaves nothing half created.
+        self.create_log_file(id)
+        team = self.registry.add({
                 "team_name": team_name,
                 "id": id,
                 "players": player_ids if player_ids else [],
                 "game": game
         })
-        self.create_log_file(id)
-        self.save()
+        self.mega_log.add_team(team)
+        # Written now rather than coalesced, so that logs added to the team can't outlive it in a crash.
+        self.save(flush=True)
         return id
 
-    def get_team_json_path(self):
-        return DATA_ROOT + "teams.json"
-
-    def create_log_file(self, id: int) -> str:
+    def create_log_file(self, id: int):
         """
-        This function creates a log file and returns the path to it.
-        :param id: The team id to create the log file for.
-        :return: The path top the file.
+        This function creates the log for a team.
+        :param id: The team id to create the log for.
+        :return: Whatever the storage backend returns, the path to the file for .csv logs.
         """
-        log_path = f"{id}.csv"
-        if log_path in os.listdir(self.teams_dir):
-            raise FileExistsError(f"Log file already exists for team id: \"{id}\"!")
-
-        log_path = self.teams_dir + log_path
-
-        with open(log_path, "w+") as file:
-            writer = csv.DictWriter(file, fieldnames=self.headers)
-            writer.writeheader()
-            print(f"Log file created for team id: \"{id}\"!")
-            return log_path
+        return self.storage.create_log(id)
 
-    def get_log_file(self, *, id: int = None, team_name: str = None) -> str:
+    @metrics.timed("logmanager_seconds")
+    def export_log(self, team_id: int):
         """
-        This function returns a log file for a team by either id or team name.
-        :param id: Optional: the id to find the team by.
-        :param team_name: Optional: the team name to find the team by.
-        :return: The path to the .csv file.
+        Renders a team's log as a .csv file.
+        :param team_id: The id of the team.
+        :return: A buffer containing the .csv.
         """
-        assert team_name is not None or id is not None
-        if team_name:
-            id = self.team_name_to_id[team_name]
-
-        log_path = f"{id}.csv"
-        if log_path not in os.listdir(self.teams_dir):
-            raise FileNotFoundError(f"Log file does not exist for team id: \"{id}\"!")
-
-        log_path = self.teams_dir + log_path
-
-        return log_path
+        return self.storage.export_log(team_id)
 
+    @metrics.timed("logmanager_seconds")
     def add_player_to_team(self, team_id: int, player_id: int) -> list[int]:
         """
         Adds a player to a team
@@ -109,14 +222,11 @@ class LogManager:
         :return: The list of players on that team.
         """
         assert team_id is not None and player_id is not None
-        for team in self.teams:
-            if team["id"] == team_id:
-                team["players"].append(player_id)
-                self.player_map[player_id] = team_id
-                self.save()
-                return team
-        raise LookupError(f"Cannot find team with team id: \"{team_id}\"!")
+        team = self.registry.add_player(team_id, player_id)
+        self.save()
+        return team
 
+    @metrics.timed("logmanager_seconds")
     def remove_player_from_team(self, team_id: int, player_id: int) -> list[int]:
         """
         Adds a player to a team
@@ -125,21 +235,21 @@ class LogManager:
         :return: The list of players on that team.
         """
         assert team_id is not None and player_id is not None
-        for team in self.teams:
-            if team["id"] == team_id:
-                team["players"].remove(player_id)
-                del self.player_map[player_id]
-                self.save()
-                return team
-        raise LookupError(f"Cannot find team with team id: \"{team_id}\"!")
+        team = self.registry.remove_player(team_id, player_id)
+        self.save()
+        return team
 
     def get_team(self, team_id: int) -> dict:
-        assert team_id is not None
-        for team in self.teams:
-            if team["id"] == team_id:
-                return team
-        raise LookupError(f"Cannot find team with team id: \"{team_id}\"!")
+        return self.registry.get(team_id)
 
+    def get_teams_of_player(self, player_id: int) -> set:
+        """
+        :param player_id: The discord id of the player.
+        :return: The ids of every team the player is on.
+        """
+        return self.registry.get_teams_of(player_id)
+
+    @metrics.timed("logmanager_seconds")
     def add_game_to_team(self, team_id: int, game_name: str):
         """
         Adds a player to a team
@@ -148,87 +258,248 @@ class LogManager:
         :return: The list of players on that team.
         """
         assert team_id and game_name
-        for team in self.teams:
-            if team["id"] == team_id:
-                team["game"] = game_name
-                self.save()
-                return team
-        raise LookupError(f"Cannot find team with team id: \"{team_id}\"!")
+        team = self.registry.set_game(team_id, game_name)
+        self.mega_log.update_team(team)
+        self.save()
+        return team
 
+    @metrics.timed("logmanager_seconds")
+    def rename_team(self, team_id: int, team_name: str):
+        """
+        Renames a team
+        :param team_id: The id of the team.
+        :param team_name: The new name of the team.
+        :return: The team.
+        """
+        assert team_name
+        team = self.registry.rename(team_id, team_name)
+        self.mega_log.update_team(team)
+        self.save()
+        return team
+
+    @metrics.timed("logmanager_seconds")
     def add_log(
             self,
             team_id: int,
             date_of_practice: datetime.date,
-            length: str,
+            duration: float,
+            unit: Unit,
             log_type: str,
             submitted_by_name: str,
             result: str,
             opponent: str = ""
-    ):
-        with open(self.get_log_file(id=team_id), "a", newline="") as csvfile:
-            logfile = csv.writer(csvfile)
-            now = datetime.date.today()
-
-            logfile.writerow([
-                date_of_practice.strftime("%m/%d/%Y"),
-                length,
-                log_type,
-                now.strftime("%m/%d/%Y"),
-                submitted_by_name,
-                result,
-                opponent
-            ])
+    ) -> LogEntry:
+        """
+        Adds an entry to a team's log.
+        :param team_id: The id of the team.
+        :param date_of_practice: The day it happened.
+        :param duration: How many units were played.
+        :param unit: A Unit, or its label such as "hours" or "best-of".
+        :param log_type: "Practice", "Scrimmage" or "Match".
+        :param submitted_by_name: Who logged it.
+        :param result: "Win", "Loss" or "N/A".
+        :param opponent: Optional: who it was against.
+        :return: The new entry.
+        """
+        entry = LogEntry(
+            date_of_practice.toordinal(),
+            float(duration),
+            unit if isinstance(unit, Unit) else Unit.from_label(unit),
+            log_type,
+            datetime.date.today().toordinal(),
+            submitted_by_name or "",
+            result or "",
+            opponent or ""
+        )
+        self.add_logs(team_id, [entry])
+        return entry
+
+    @metrics.timed("logmanager_seconds")
+    def add_logs(self, team_id: int, entries: list[LogEntry]):
+        """
+        Adds several entries to a team's log, with one write to storage.
+        :param team_id: The id of the team.
+        :param entries: The entries, in the order they should be added.
+        """
+        if not entries:
+            return
+        team = self.get_team(team_id)
+        size = sum(estimate_size(entry) for entry in entries)
+        with self.mega_log.team_lock(team_id):
+            self.storage.append_logs(team_id, entries)
+            self.mega_log.append(team, [entry.to_row() for entry in entries])
+            self.log_versions[team_id] = self.log_versions.get(team_id, 0) + 1
+
+            # Only keep the index up to date if it has been loaded, otherwise it will pick up the entries from
+            # storage.
+            with self.logs_lock:
+                if team_id in self.logs:
+                    self.logs[team_id].extend(entries)
+                    self.log_sizes[team_id] += size
+                    self.logs_size += size
+                    self.logs.move_to_end(team_id)
+                    self.evict_logs(keep=team_id)
+                if team_id in self.summaries:
+                    for entry in entries:
+                        self.summaries[team_id].add(entry)
+
+    @metrics.timed("logmanager_seconds")
+    def load_log(self, team_id: int) -> list[LogEntry]:
+        """
+        Returns the in-memory log for a team, reading it from storage the first time it is requested.
+        :param team_id: The id of the team.
+        :return: The list of log entries. This is the index itself, so do not modify it.
+        """
+        with self.logs_lock:
+            metrics.record_cache("logs", team_id in self.logs)
+            if team_id in self.logs:
+                self.logs.move_to_end(team_id)
+                return self.logs[team_id]
+
+        # Reading and storing the log holds the same lock as add_logs, so that nothing is logged in between.
+        with self.mega_log.team_lock(team_id):
+            with self.logs_lock:
+                if team_id in self.logs:
+                    # Loaded by another thread while this one waited.
+                    self.logs.move_to_end(team_id)
+                    return self.logs[team_id]
+
+            log = self.storage.read_log(team_id)
+            summary = LogSummary()
+            size = 0
+            for entry in log:
+                summary.add(entry)
+                size += estimate_size(entry)
+
+            with self.logs_lock:
+                self.logs[team_id] = log
+                self.log_sizes[team_id] = size
+                self.logs_size += size
+                self.summaries[team_id] = summary
+                self.evict_logs(keep=team_id)
+        return log
+
+    def evict_logs(self, keep: int = None):
+        """
+        Drops the least recently used logs until the loaded logs fit in the memory budget.
+        :param keep: Optional: a team whose log is in use and must not be dropped.
+        """
+        with self.logs_lock:
+            for team_id in list(self.logs):
+                if self.logs_size <= self.log_cache_bytes:
+                    break
+                if team_id == keep:
+                    continue
+                del self.logs[team_id]
+                self.logs_size -= self.log_sizes.pop(team_id)
 
+    @metrics.timed("logmanager_seconds")
+    def get_summary(self, team_id: int) -> LogSummary:
+        """
+        Returns the summary of a team's log. Backends that can query it directly are asked for it, otherwise
+        the whole log is loaded.
+        :param team_id: The id of the team.
+        :return: The summary.
+        """
+        metrics.record_cache("summaries", team_id in self.summaries)
+        if team_id not in self.summaries:
+            with self.mega_log.team_lock(team_id):
+                if team_id not in self.summaries:
+                    summary = self.storage.read_summary(team_id)
+                    if summary is not None:
+                        self.summaries[team_id] = LogSummary(*summary)
+            if team_id not in self.summaries:
+                self.load_log(team_id)
+        return self.summaries[team_id]
+
+    def get_log_entries(self, team_id: int) -> list[LogEntry]:
+        return list(self.load_log(team_id))
+
+    @metrics.timed("logmanager_seconds")
+    def get_log_range(self, team_id: int, start: datetime.date, end: datetime.date) -> list[LogEntry]:
+        """
+        Returns the entries of a team's log dated between two days. A loaded log is filtered in memory, otherwise
+        only the part of storage that overlaps is read and the log isn't loaded.
+        :param team_id: The id of the team.
+        :param start: The first day.
+        :param end: The last day.
+        :return: The entries, in log order.
+        """
+        start, end = start.toordinal(), end.toordinal()
+        with self.logs_lock:
+            metrics.record_cache("logs", team_id in self.logs)
+            if team_id in self.logs:
+                return [entry for entry in self.logs[team_id] if start <= entry.date <= end]
+        return self.storage.read_log_range(team_id, start, end)
+
+    @metrics.timed("logmanager_seconds")
+    def export_log_range(self, team_id: int, start: datetime.date, end: datetime.date) -> tuple[io.BytesIO, int]:
+        """
+        Renders the entries of a team's log dated between two days as a .csv file.
+        :return: A buffer containing the .csv, and how many entries it has.
+        """
+        entries = self.get_log_range(team_id, start, end)
+        return export_entries(entries), len(entries)
+
+    @metrics.timed("logmanager_seconds")
     def get_log_as_objects(self, team_id: int) -> [dict]:
-        with open(self.get_log_file(id=team_id), "r") as csvfile:
-            csv_reader = csv.DictReader(csvfile)
-
-            deserialized = []
-            for entry in csv_reader:
-                deserialized.append({
-                    **entry,
-                    "Date": datetime.datetime.strptime(entry["Date"], "%m/%d/%Y").date(),
-                    "Submitted On": datetime.datetime.strptime(entry["Submitted On"], "%m/%d/%Y").date()
-                })
-            return deserialized
+        return [entry.to_dict() for entry in self.load_log(team_id)]
 
+    @metrics.timed("logmanager_seconds")
     def get_most_recent_practice(self, team_id: int, include_matches=False) -> dict:
-        log = self.get_log_as_objects(team_id)
+        most_recent = self.get_summary(team_id).most_recent(include_matches)
+        return most_recent.to_dict() if most_recent is not None else None
 
-        if len(log) == 0:
-            return None
-        most_recent = log[0]
-        for entry in log:
-            if entry["Type"] in ["Scrimmage", "Practice"] or include_matches:
-                if entry["Date"] > most_recent["Date"]:
-                    most_recent = entry
-
-        return most_recent
-
-    def get_inverse_team_map(self):
-        return {name: team_id for team_id, name in self.team_name_to_id.items()}
-
-    def get_mega_log(self):
-
-        mega_log_path = DATA_ROOT + "mega_log.csv"
-        mega_log_file = open(mega_log_path, "w+", newline="")
-        
-        modified_headers = ["Team Name", "Team ID", "Game"] + [header for header in self.headers]
-
-        mega_log = csv.writer(mega_log_file)
-        mega_log.writerow(modified_headers)
-
-        for team in self.teams:
-            log_path = self.teams_dir + f"{team['id']}.csv"
-            with open(log_path, "r") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    mega_log.writerow([
-                        team["team_name"],
-                        team["id"],
-                        team["game"],
-                        *[row[header] if header in row else "" for header in self.headers]
-                    ])
-        
-        mega_log_file.close()
-        return mega_log_path
+    def get_inverse_team_map(self) -> dict[int, str]:
+        return self.registry.id_to_name
+
+    @metrics.timed("logmanager_seconds")
+    def get_mega_log(self, compression: str = None) -> tuple[io.BytesIO, str]:
+        """
+        Returns the mega log, a .csv with every team's log in it. It is materialized the first time this is
+        called and kept up to date from then on, and compressed copies are cached until it changes.
+        :param compression: Optional: "gzip" or "zip" to compress the file.
+        :return: A buffer with the file in it and the file name to give it.
+        """
+        assert compression in MEGA_LOG_COMPRESSIONS
+        if not self.mega_log.complete and not self.mega_log.load(self.teams, self.storage.count_logs):
+            self.mega_log.build(self.teams, lambda team_id: [entry.to_row() for entry in self.storage.read_log(team_id)])
+
+        if compression is None:
+            return io.BytesIO(self.mega_log.read()), "mega_log.csv"
+
+        cached = self.mega_log_cache.get(compression)
+        metrics.record_cache("mega_log_export", cached is not None and cached[0] == self.mega_log.version)
+        if cached is None or cached[0] != self.mega_log.version:
+            # Read the version first so that a log added while compressing invalidates the result.
+            version = self.mega_log.version
+            buffer = io.BytesIO()
+            if compression == "zip":
+                filename = "mega_log.zip"
+                with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+                    archive.writestr("mega_log.csv", self.mega_log.read())
+            else:
+                filename = "mega_log.csv.gz"
+                with gzip.GzipFile(filename="mega_log.csv", fileobj=buffer, mode="wb") as file:
+                    file.write(self.mega_log.read())
+            cached = (version, buffer.getvalue(), filename)
+            self.mega_log_cache[compression] = cached
+
+        return io.BytesIO(cached[1]), cached[2]
+
+    @metrics.timed("logmanager_seconds")
+    def get_team_table(self, team_id: int):
+        """
+        Returns a team's log as an Arrow table with the mega log's columns, for columnar exports. It is cached
+        until the team logs something or is renamed.
+        :param team_id: The id of the team.
+        :return: A pyarrow.Table.
+        """
+        team = self.get_team(team_id)
+        key = (self.log_versions.get(team_id, 0), team["team_name"], team["game"])
+        cached = self.team_tables.get(team_id)
+        metrics.record_cache("team_tables", cached is not None and cached[:3] == key)
+        if cached is None or cached[:3] != key:
+            cached = key + (build_team_table(team, self.load_log(team_id)),)
+            self.team_tables[team_id] = cached
+        return cached[3]
@@ -0,0 +1,232 @@
+import csv, json, os
+import io
+import threading
+from array import array
+from collections import Counter
+
+from metrics import metrics
+from records import LOG_HEADERS
+
+MEGA_LOG_HEADERS = ["Team Name", "Team ID", "Game"] + LOG_HEADERS
+
+
+class MegaLog:
+    """
+    A materialized mega log: every team's log in one .csv, kept at `path`.
+
+    It is built from storage the first time it is needed, and from then on add_log appends new rows to it and
+    update_team re-renders only the rows of a team whose name or game changed. Rows added after the build are
+    in the order they were logged rather than grouped by team.
+
+    Appends to a team must hold team_lock(team_id) across writing the row to storage and calling append(),
+    so that a build in progress never sees a row twice. LogManager also holds it while loading a team's log.
+
+    save() records where every row is in {path}.state on shutdown, and load() reuses the file in the next
+    process if no team has been logged to or renamed since.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state_path = path + ".state"
+        self.lock = threading.RLock()
+        self.team_locks: dict[int, threading.Lock] = {}
+        self.built_teams: set = set()
+        self.started = False
+        self.complete = False
+        # Bumped on every change so that exports derived from the file can be cached.
+        self.version = 0
+
+        # Where every row starts in the file and which team it belongs to.
+        self.offsets = array("Q")
+        self.row_teams = array("q")
+        self.size = 0
+        # The (name, game) each team's rows were rendered with.
+        self.prefixes: dict[int, tuple] = {}
+
+    def team_lock(self, team_id: int) -> threading.Lock:
+        with self.lock:
+            if team_id not in self.team_locks:
+                self.team_locks[team_id] = threading.Lock()
+            return self.team_locks[team_id]
+
+    @staticmethod
+    def render(team: dict, row: dict) -> bytes:
+        buffer = io.StringIO(newline="")
+        csv.writer(buffer).writerow([
+            team["team_name"],
+            team["id"],
+            team["game"],
+            *[row[header] if header in row else "" for header in LOG_HEADERS]
+        ])
+        return buffer.getvalue().encode()
+
+    def write_rows(self, file, team: dict, rows: list[dict]):
+        start = self.size
+        for row in rows:
+            line = self.render(team, row)
+            file.write(line)
+            self.offsets.append(self.size)
+            self.row_teams.append(team["id"])
+            self.size += len(line)
+        metrics.record_write("mega_log", self.size - start)
+        self.prefixes[team["id"]] = (team["team_name"], team["game"])
+
+    def build(self, teams: list[dict], read_log):
+        """
+        Writes the whole mega log from scratch.
+        :param teams: The teams to include.
+        :param read_log: A function that returns the log rows for a team id.
+        """
+        with self.lock:
+            self.started = True
+            self.built_teams = set()
+            self.offsets = array("Q")
+            self.row_teams = array("q")
+            self.prefixes = {}
+            header = io.StringIO(newline="")
+            csv.writer(header).writerow(MEGA_LOG_HEADERS)
+            with open(self.path, "wb") as file:
+                file.write(header.getvalue().encode())
+            self.size = len(header.getvalue().encode())
+
+        for team in list(teams):
+            with self.team_lock(team["id"]):
+                if team["id"] in self.built_teams:
+                    # Created after the build started, add_team and append have already covered it.
+                    continue
+                rows = read_log(team["id"])
+                with self.lock, open(self.path, "ab") as file:
+                    self.write_rows(file, team, rows)
+                    self.built_teams.add(team["id"])
+
+        with self.lock:
+            self.complete = True
+            self.version += 1
+
+    def save(self):
+        """
+        Records the row offsets and teams of a complete mega log, with the size and modification time of the
+        file they describe. Call this once nothing is logged anymore.
+        """
+        with self.lock:
+            if not self.complete:
+                return
+            stat = os.stat(self.path)
+            header = {
+                "size": self.size,
+                "mtime": stat.st_mtime_ns,
+                "rows": len(self.offsets),
+                "prefixes": {team_id: list(prefix) for team_id, prefix in self.prefixes.items()}
+            }
+            with open(self.state_path + ".tmp", "wb") as file:
+                file.write(json.dumps(header).encode() + b"\n")
+                self.offsets.tofile(file)
+                self.row_teams.tofile(file)
+            os.replace(self.state_path + ".tmp", self.state_path)
+
+    def load(self, teams: list[dict], count_logs) -> bool:
+        """
+        Reuses the mega log a previous process saved, instead of building it. Each team's row count in the file
+        is checked against its log, so that rows that reached storage but not the file are never missed.
+        :param teams: The teams to include.
+        :param count_logs: A function that returns how many log rows a team id has.
+        :return: Whether the file was reused. If not, call build().
+        """
+        try:
+            with open(self.state_path, "rb") as file:
+                header = json.loads(file.readline())
+                offsets = array("Q")
+                offsets.fromfile(file, header["rows"])
+                row_teams = array("q")
+                row_teams.fromfile(file, header["rows"])
+            # Anything appended from here on makes the state stale, so it is only ever used once.
+            os.unlink(self.state_path)
+            stat = os.stat(self.path)
+        except (OSError, ValueError, EOFError, KeyError):
+            return False
+        prefixes = {int(team_id): tuple(prefix) for team_id, prefix in header["prefixes"].items()}
+        if (stat.st_size, stat.st_mtime_ns) != (header["size"], header["mtime"]) or set(prefixes) != {team["id"] for team in teams}:
+            return False
+
+        with self.lock:
+            self.started = True
+            self.built_teams = set()
+            self.offsets = offsets
+            self.row_teams = row_teams
+            self.size = header["size"]
+            self.prefixes = prefixes
+
+        counts = Counter(row_teams)
+        for team in list(teams):
+            with self.team_lock(team["id"]):
+                if team["id"] in self.built_teams:
+                    continue
+                if count_logs(team["id"]) != counts[team["id"]]:
+                    return False
+                # Checked under the lock update_team takes, so a rename either shows here or re-renders the rows.
+                with self.lock:
+                    if self.prefixes.get(team["id"]) != (team["team_name"], team["game"]):
+                        return False
+                    self.built_teams.add(team["id"])
+
+        with self.lock:
+            self.complete = True
+            self.version += 1
+        return True
+
+    def append(self, team: dict, rows: list[dict]):
+        """
+        Adds newly logged rows. Rows for teams the build hasn't reached yet are skipped, the build reads them.
+        """
+        with self.lock:
+            if team["id"] not in self.built_teams:
+                return
+            with open(self.path, "ab") as file:
+                self.write_rows(file, team, rows)
+            self.version += 1
+
+    def add_team(self, team: dict):
+        """
+        Registers a newly created team. It has no rows yet, so it counts as built.
+        """
+        with self.lock:
+            if self.started:
+                self.built_teams.add(team["id"])
+                self.prefixes[team["id"]] = (team["team_name"], team["game"])
+
+    def update_team(self, team: dict):
+        """
+        Re-renders a team's rows after its name or game changed. Every other row is copied as is.
+        """
+        with self.lock:
+            if team["id"] not in self.built_teams or self.prefixes.get(team["id"]) == (team["team_name"], team["game"]):
+                return
+
+            temp_path = self.path + ".tmp"
+            offsets = array("Q")
+            with open(self.path, "rb") as source, open(temp_path, "wb") as destination:
+                destination.write(source.read(self.offsets[0] if self.offsets else self.size))
+                ends = list(self.offsets[1:]) + [self.size]
+                for start, end, team_id in zip(self.offsets, ends, self.row_teams):
+                    line = source.read(end - start)
+                    if team_id == team["id"]:
+                        values = next(csv.reader(io.StringIO(line.decode(), newline="")))
+                        line = self.render(team, dict(zip(MEGA_LOG_HEADERS, values)))
+                    offsets.append(destination.tell())
+                    destination.write(line)
+                size = destination.tell()
+            os.replace(temp_path, self.path)
+
+            self.offsets = offsets
+            self.size = size
+            self.prefixes[team["id"]] = (team["team_name"], team["game"])
+            self.version += 1
+
+    def read(self) -> bytes:
+        """
+        Returns the mega log as it is now, without any row that is still being appended.
+        """
+        with self.lock:
+            with open(self.path, "rb") as file:
+                metrics.record_read("mega_log", self.size)
+                return file.read(self.size)
@@ -0,0 +1,181 @@
+import asyncio
+import bisect
+import functools
+import threading
+import time
+
+# Upper bounds, in seconds, of the latency histogram buckets. The last bucket is everything slower.
+LATENCY_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class Histogram:
+    __slots__ = ("bounds", "buckets", "count", "sum")
+
+    def __init__(self, bounds: list[float] = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """
+        Estimates a quantile by interpolating inside the bucket it falls in, like Prometheus' histogram_quantile.
+        """
+        if self.count == 0:
+            return float("nan")
+        rank = q * self.count
+        seen = 0
+        for index, bucket in enumerate(self.buckets):
+            if seen + bucket >= rank and bucket:
+                lower = self.bounds[index - 1] if index > 0 else 0.0
+                if index == len(self.bounds):
+                    return lower
+                return lower + (self.bounds[index] - lower) * (rank - seen) / bucket
+            seen += bucket
+        return self.bounds[-1]
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else str(value)
+
+
+def format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f"{key}=\"{value}\"" for key, value in labels) + "}"
+
+
+class Metrics:
+    """
+    Latency histograms and counters, each identified by a name and a set of labels. Safe to use from any thread.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms: dict[tuple, Histogram] = {}
+        self.counters: dict[tuple, float] = {}
+
+    @staticmethod
+    def key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(seconds)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def record_cache(self, cache: str, hit: bool):
+        self.increment("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+    def record_read(self, kind: str, size: int):
+        self.increment("file_opens_total", kind=kind, mode="read")
+        self.increment("bytes_read_total", size, kind=kind)
+
+    def record_write(self, kind: str, size: int):
+        self.increment("file_opens_total", kind=kind, mode="write")
+        self.increment("bytes_written_total", size, kind=kind)
+
+    def timed(self, name: str, **labels):
+        """
+        Decorates a function, or a coroutine function, to record how long every call takes.
+        The function's name is added as the "operation" label unless one is given.
+        """
+        def decorator(function):
+            operation = {"operation": function.__name__, **labels}
+
+            if asyncio.iscoroutinefunction(function):
+                @functools.wraps(function)
+                async def wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return await function(*args, **kwargs)
+                    finally:
+                        self.observe(name, time.perf_counter() - start, **operation)
+            else:
+                @functools.wraps(function)
+                def wrapper(*args, **kwargs):
+                    start = time.perf_counter()
+                    try:
+                        return function(*args, **kwargs)
+                    finally:
+                        self.observe(name, time.perf_counter() - start, **operation)
+            return wrapper
+        return decorator
+
+    def cache_hit_rates(self) -> dict[str, tuple[int, float]]:
+        """
+        :return: A dict of cache name to (requests, hit rate).
+        """
+        totals: dict[str, list] = {}
+        with self.lock:
+            for (name, labels), value in self.counters.items():
+                if name == "cache_requests_total":
+                    labels = dict(labels)
+                    total = totals.setdefault(labels["cache"], [0, 0])
+                    total[0] += value
+                    total[1] += value if labels["result"] == "hit" else 0
+        return {cache: (int(requests), hits / requests) for cache, (requests, hits) in totals.items()}
+
+    def summary(self, limit: int = 15) -> str:
+        """
+        A plain text table of the slowest operations by total time, then the counters and cache hit rates.
+        """
+        with self.lock:
+            histograms = sorted(self.histograms.items(), key=lambda item: -item[1].sum)[:limit]
+            lines = [f"{'Operation':<36} {'Count':>7} {'p50 ms':>8} {'p99 ms':>8} {'Total s':>8}"]
+            for (name, labels), histogram in histograms:
+                operation = name.removesuffix("_seconds")
+                if "operation" in dict(labels):
+                    operation += "." + dict(labels)["operation"]
+                lines.append(
+                    f"{operation[:36]:<36} {histogram.count:>7} {histogram.quantile(0.5) * 1000:>8.1f} "
+                    f"{histogram.quantile(0.99) * 1000:>8.1f} {histogram.sum:>8.3f}"
+                )
+            lines.append("")
+            for (name, labels), value in sorted(self.counters.items()):
+                if name != "cache_requests_total":
+                    lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        lines.append("")
+        for cache, (requests, hit_rate) in sorted(self.cache_hit_rates().items()):
+            lines.append(f"{cache} cache: {hit_rate:.0%} hits of {requests}")
+        return "\n".join(lines)
+
+    def to_prometheus(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name in sorted({name for name, labels in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (other, labels), histogram in sorted(self.histograms.items()):
+                    if other != name:
+                        continue
+                    cumulative = 0
+                    for bound, bucket in zip(histogram.bounds + ["+Inf"], histogram.buckets):
+                        cumulative += bucket
+                        lines.append(f"{name}_bucket{format_labels(labels + (('le', str(bound)),))} {cumulative}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{format_labels(labels)} {histogram.count}")
+            for name in sorted({name for name, labels in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (other, labels), value in sorted(self.counters.items()):
+                    if other == name:
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# Everything in the process records into this.
+metrics = Metrics()
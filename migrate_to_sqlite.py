@@ -0,0 +1,77 @@
+import json, os
+import sys
+
+from guilds import get_data_roots
+from storage import SQLiteStorage, SeasonArchive, read_log_file
+
+# One-shot import of teams.json and teams/*.csv into an SQLite database, for data/ and for every guild's
+# data/guilds/{id}/. Each one's database goes in the same directory, at {data directory}esports.db, where
+# UAH_ESPORTS_STORAGE=sqlite looks for it.
+# Stop the bot first. The .csv data is only read, so anything the bot hasn't finished writing, rows still in
+# journal.log or a season seal that was cut short, makes this refuse rather than be left out.
+# Usage: python migrate_to_sqlite.py
+
+
+def find_unfinished_writes(data_root: str) -> list[str]:
+    """
+    :return: The files the bot still has to fold into the team logs when it next starts.
+    """
+    unfinished = [
+        path for path in [data_root + "journal.log.compacting", data_root + "journal.log.manifest"]
+        if os.path.exists(path)
+    ]
+    if os.path.exists(data_root + "journal.log") and os.path.getsize(data_root + "journal.log") > 0:
+        unfinished.append(data_root + "journal.log")
+    pending_dir = data_root + "archive/pending/"
+    if os.path.isdir(pending_dir) and os.listdir(pending_dir):
+        unfinished.append(pending_dir)
+    return unfinished
+
+
+def read_log(data_root: str, team_id: int) -> list:
+    """
+    Reads a team's sealed seasons and then its current season, without sealing or converting anything.
+    """
+    archive = SeasonArchive(f"{data_root}archive/{team_id}/", f"{data_root}archive/pending/{team_id}")
+    return archive.read_all() + read_log_file(f"{data_root}teams/{team_id}.csv")
+
+
+def migrate(data_root: str):
+    database_path = data_root + "esports.db"
+    destination = SQLiteStorage(database_path)
+
+    if destination.log_ids:
+        print(f"{database_path} already contains logs, refusing to import twice.")
+    else:
+        team_info = {}
+        if os.path.exists(data_root + "teams.json"):
+            with open(data_root + "teams.json", "r") as file:
+                team_info = json.load(file)
+        destination.save_team_info({"teams": team_info.get("teams", [])})
+        print(f"Imported {len(team_info.get('teams', []))} teams into {database_path}")
+
+        # Import every log file, including ones for teams that are missing from teams.json.
+        log_names = os.listdir(data_root + "teams/") if os.path.isdir(data_root + "teams/") else []
+        for log_name in sorted(log_names):
+            if not log_name.endswith(".csv"):
+                continue
+            team_id = int(log_name[:-len(".csv")])
+            rows = read_log(data_root, team_id)
+            destination.create_log(team_id)
+            destination.append_logs(team_id, rows)
+            print(f"Imported {len(rows)} logs for team id: \"{team_id}\"")
+
+    destination.close()
+
+
+data_roots = get_data_roots()
+if not data_roots:
+    sys.exit("There is no data to import.")
+unfinished = [path for data_root in data_roots for path in find_unfinished_writes(data_root)]
+if unfinished:
+    sys.exit(
+        "The bot is running or didn't shut down cleanly, these still have to be written to the team logs: "
+        + ", ".join(unfinished) + ". Start the bot once and stop it, then run this again."
+    )
+for data_root in data_roots:
+    migrate(data_root)
@@ -1,16 +1,35 @@
+import asyncio
 import datetime
+import io
 import json
+import math
 from typing import Union
 
 import discord
 import discord.ext.commands as commands
 import logmanager
+from async_logmanager import IMPORT_KEY, STATS_KEY, TEAMS_KEY
+from autocomplete import PrefixIndex
+from columnar import COLUMNAR_FORMATS
+from dispatch import MessageDispatcher
+from guilds import GuildPartition, GuildPartitions
+from log_import import MAX_IMPORT_BYTES, LogImport, parse_log_date
+from metrics import metrics
+from render import MESSAGE_LIMIT, send_rendered
 import re
 
 
 logs = discord.SlashCommandGroup("log", "Logging commands")
 teams = discord.SlashCommandGroup("team", "Team related commands")
-logger = logmanager.LogManager()
+admin = discord.SlashCommandGroup(
+    "bot", "Bot administration", default_member_permissions=discord.Permissions(administrator=True)
+)
+# Every guild's teams and logs are kept apart. A guild's data is only read once it first uses a command.
+partitions = GuildPartitions.from_env()
+# Everything that can send a lot of messages at once goes through this, so that it stays under the rate limits.
+dispatcher = MessageDispatcher()
+# DM waves started by /log ping_violators. Tasks are kept until they finish.
+dm_tasks: set[asyncio.Task] = set()
 
 # ----------------------------------------------------------------------------------------------------------- Models ---
 class TeamNotFoundException(Exception):
@@ -25,36 +44,92 @@ def format_json(data):
 def format_codeblock(code, language=None):
     return f"```{language if language else ''}\n{code}```"
 
-def get_team_id_using(team_id: int = None, team_name: str = None, ctx: discord.ApplicationContext = None):
+async def get_partition(ctx: Union[discord.ApplicationContext, discord.AutocompleteContext]) -> GuildPartition:
+    return await partitions.get(ctx.interaction.guild_id).load()
+
+def find_team_id(logger: logmanager.LogManager, team_name: str, player_id: int) -> int:
+    """
+    Looks a team up by name, or else by the one team the player is on. Run it under TEAMS_KEY, with a
+    RemoteLogManager every lookup is a round trip to the storage server.
+    :return: The team id, or None if there is no team or there is doubt about which one is meant.
+    """
+    team_name_to_id = logger.team_name_to_id
+    if team_name in team_name_to_id:
+        return team_name_to_id[team_name]
+    # Only fall back to the user's team if there is no doubt about which one they mean.
+    player_teams = logger.get_teams_of_player(player_id)
+    if len(player_teams) == 1:
+        return next(iter(player_teams))
+    return None
+
+async def get_team_id_using(team_id: int = None, team_name: str = None, ctx: discord.ApplicationContext = None):
     if team_id is None:
-        if team_name in logger.team_name_to_id:
-            return logger.team_name_to_id[team_name]
-        elif ctx.author.id in logger.player_map:
-            return logger.player_map[ctx.author.id]
-        raise TeamNotFoundException()
+        guild = await get_partition(ctx)
+        team_id = await guild.async_logger.run(TEAMS_KEY, find_team_id, guild.logger, team_name, ctx.author.id)
+        if team_id is None:
+            raise TeamNotFoundException()
+        if team_name:
+            guild.team_name_index.record_use(team_name)
 
     return team_id
 
-def sort_teams_into_bad_and_good():
-    most_recent_practices = {team: logger.get_most_recent_practice(team) for team in logger.team_name_to_id.values()}
+async def sort_teams_into_bad_and_good(guild: GuildPartition):
+    return await guild.violator_report.get()
 
-    about_two_weeks_ago = datetime.date.today() - datetime.timedelta(14)
+def get_team_map(logger: logmanager.LogManager) -> dict[int, dict]:
+    """
+    Every team by id, read with one call so that a RemoteLogManager makes one round trip. Run it under TEAMS_KEY.
+    """
+    return {team["id"]: team for team in logger.teams}
 
-    guilty, innocent = [], []
-    for team, practice in most_recent_practices.items():
-        if practice is None:
-            guilty.append((team, practice))
-        else:
-            tup = (team, practice["Date"].strftime("%m/%d/%Y"))
-            if practice["Date"] < about_two_weeks_ago:
-                guilty.append(tup)
-            else:
-                innocent.append(tup)
-    return guilty, innocent
+def format_violators(team_map: dict[int, dict], guilty) -> str:
+    """
+    Builds the message pinging the players of every guilty team.
+    :param team_map: The guild's teams, from get_team_map.
+    :param guilty: The guilty teams from sort_teams_into_bad_and_good.
+    :return: The message, or None if there are no violators.
+    """
+    to_ping = {team_id: team_map[team_id]["players"] for team_id, last_practice in guilty}
+
+    if len(to_ping) == 0:
+        return None
+
+    msg = "The following teams need to practice:\n"
+    for team_id, players in to_ping.items():
+        msg += f"**{team_map[team_id]['team_name']}**:\n\t" + "\n\t".join([f"<@{player}>" for player in players]) + "\n"
+    return msg
+
+async def dm_violators(client: discord.Client, team_map: dict[int, dict], guilty) -> tuple[int, int]:
+    """
+    Sends every player of every guilty team a DM.
+    :return: (how many players got one, how many couldn't be sent one).
+    """
+    delivered = failed = 0
+    for team_id, last_practice in guilty:
+        sent, not_sent = await dispatcher.send_dms(
+            client,
+            team_map[team_id]["players"],
+            f"**{team_map[team_id]['team_name']}** needs to practice! Log it with `/log practice` once you have."
+        )
+        delivered += sent
+        failed += not_sent
+    return delivered, failed
+
+async def report_dms(ctx: discord.ApplicationContext, team_map: dict[int, dict], guilty):
+    """
+    DMs the guilty teams' players and then tells whoever asked how many got one.
+    """
+    delivered, failed = await dm_violators(ctx.bot, team_map, guilty)
+    await dispatcher.respond(ctx, f"Sent {delivered} DMs" + (f", {failed} players don't accept them." if failed else "."))
 # ----------------------------------------------------------------------------------------------------- Autocomplete ---
 
+# Each option list has a PrefixIndex. The callbacks are given to Discord directly rather than through
+# discord.utils.basic_autocomplete, which would filter the ranked results down to prefix matches again.
+
+@metrics.timed("autocomplete_seconds")
 async def get_team_names(ctx: discord.AutocompleteContext):
-    return [team for team in logger.team_name_to_id.keys() if team.lower().startswith(ctx.value.lower())]
+    guild = await get_partition(ctx)
+    return guild.team_name_index.search(ctx.value)
 
 units = [
     "hours",
@@ -62,16 +137,20 @@ units = [
     "maps",
     "best-of"
 ]
+unit_index = PrefixIndex(units)
+@metrics.timed("autocomplete_seconds")
 async def get_unit_options(ctx: discord.AutocompleteContext):
-    return [unit for unit in units if unit.startswith(ctx.value.lower())]
+    return unit_index.search(ctx.value)
 
 log_types = [
     "Practice",
     "Scrimmage",
     "Match"
 ]
+log_type_index = PrefixIndex(log_types)
+@metrics.timed("autocomplete_seconds")
 async def get_log_type(ctx: discord.AutocompleteContext):
-    return [log_type for log_type in log_types if log_type.startswith(ctx.value.lower())]
+    return log_type_index.search(ctx.value)
 
 games_with_acronyms = [
     ["Rocket League", "RL"],
@@ -91,22 +170,28 @@ game_acronym_map = {game: acronym for game, acronym in games_with_acronyms}
 games = [
     name for name, acronym in games_with_acronyms
 ]
+game_index = PrefixIndex(games)
+@metrics.timed("autocomplete_seconds")
 async def get_games(ctx: discord.AutocompleteContext):
-    return [game for game in games if game.lower().startswith(ctx.value.lower())]
+    return game_index.search(ctx.value)
 
 team_colors = [
     "Blue", "White", "Yellow", "Black"
 ]
 
+team_color_index = PrefixIndex(team_colors)
+@metrics.timed("autocomplete_seconds")
 async def get_team_color(ctx: discord.AutocompleteContext):
-    return [color for color in team_colors if color.lower().startswith(ctx.value.lower())]
+    return team_color_index.search(ctx.value)
 
 result_options = [
     "Win", "Loss", "N/A"
 ]
 
+result_index = PrefixIndex(result_options)
+@metrics.timed("autocomplete_seconds")
 async def get_log_results(ctx: discord.AutocompleteContext):
-    return [option for option in result_options if option.lower().startswith(ctx.value.lower())]
+    return result_index.search(ctx.value)
 
 # --------------------------------------------------------------------------------------------------------- Commands ---
 
@@ -116,13 +201,13 @@ async def get_log_results(ctx: discord.AutocompleteContext):
     str,
     description="The color of the team you are making. For example: Blue",
     required=True,
-    autocomplete=discord.utils.basic_autocomplete(get_team_color)
+    autocomplete=get_team_color
 )
 @discord.option(
     "game",
     str,
     required=True,
-    autocomplete=discord.utils.basic_autocomplete(get_games)
+    autocomplete=get_games
 )
 @discord.option(
     "add_self_to_team",
@@ -148,17 +233,26 @@ async def create_team(
         await ctx.respond("You must select a color from the list!")
         return
 
+    game_index.record_use(next(name for name, acronym in games_with_acronyms if acronym == game))
+    team_color_index.record_use(team_name)
     team_name = f"{game} {team_name}"
 
-    team_id = logger.create_team(team_name=team_name, game=game)
+    guild = await get_partition(ctx)
+    try:
+        team_id = await guild.async_logger.create_team(team_name=team_name, game=game)
+    except ValueError as error:
+        await ctx.respond(str(error))
+        return
+    guild.team_name_index.add(team_name)
+    await guild.violator_report.refresh([team_id])
 
     if add_self_to_team:
         print(team_id, ctx.author.id)
-        logger.add_player_to_team(team_id, ctx.author.id)
+        await guild.async_logger.add_player_to_team(team_id, ctx.author.id)
 
     await ctx.respond(format_codeblock(
         format_json(
-            logger.get_team(team_id=team_id)
+            await guild.async_logger.run(TEAMS_KEY, guild.logger.get_team, team_id)
         ),
         "json"
     ))
@@ -168,33 +262,35 @@ async def create_team(
     "team_name",
     str,
     description="Optional: The name of the team you want to get.",
-    autocomplete=discord.utils.basic_autocomplete(get_team_names),
+    autocomplete=get_team_names,
     required=False
 )
 async def get_team_info(ctx: discord.ApplicationContext, *, team_name=None, team_id: int = None):
 
     try:
-        team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+        team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
     except TeamNotFoundException:
         await ctx.respond("Could not find team! The command user must pass a team name, a team id, or be listed as a player on a team.")
         return
 
-    team_info = logger.get_team(team_id=team_id)
+    guild = await get_partition(ctx)
+    team_info = await guild.async_logger.run(TEAMS_KEY, guild.logger.get_team, team_id)
 
     await ctx.respond(format_codeblock(format_json(team_info), "json"))
 
 @teams.command(name="all", description="Gets team info.")  # guild_ids=[566299354088865812]
 async def get_team_info(ctx: discord.ApplicationContext):
-    try:
-        await ctx.respond(format_codeblock(format_json(logger.teams), "json"))
-    except discord.HTTPException:
-        await ctx.respond(file=discord.File(logger.get_team_json_path()))
+    guild = await get_partition(ctx)
+    rendered = await guild.async_logger.run(TEAMS_KEY, guild.render_teams)
+    await send_rendered(ctx, rendered, title="Teams")
 
-def verify_parameters_for_log(ctx, result, unit, duration, str_date, team_id=None, team_name=None):
+async def verify_parameters_for_log(ctx, result, unit, duration, str_date, team_id=None, team_name=None):
     if result not in result_options:
         return f"Result must be one of: {', '.join(result_options)}"
     if unit not in units:
         return f"Unit must be one of: {', '.join(units)}"
+    result_index.record_use(result)
+    unit_index.record_use(unit)
     try:
         duration = int(float(duration))
     except ValueError:
@@ -208,7 +304,7 @@ def verify_parameters_for_log(ctx, result, unit, duration, str_date, team_id=Non
         else:
             f"Date was not formatted correctly"
     try:
-        team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+        team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
     except TeamNotFoundException:
         return "Could not find team! The command user must pass a team name, a team id, or be listed as a player on a team."
 
@@ -219,7 +315,7 @@ def verify_parameters_for_log(ctx, result, unit, duration, str_date, team_id=Non
     "team_name",
     str,
     description="Optional: The name of the team you want to operate on.",
-    autocomplete=discord.utils.basic_autocomplete(get_team_names),
+    autocomplete=get_team_names,
     required=False
 )
 @discord.option(
@@ -233,7 +329,7 @@ def verify_parameters_for_log(ctx, result, unit, duration, str_date, team_id=Non
     str,
     description="The unit of time you're measuring your practice in. For example \"hours\" or \"best-of\".",
     required=True,
-    autocomplete=discord.utils.basic_autocomplete(get_unit_options)
+    autocomplete=get_unit_options
 )
 @discord.option(
     "date_of",
@@ -246,16 +342,16 @@ def verify_parameters_for_log(ctx, result, unit, duration, str_date, team_id=Non
     str,
     description="Did you win, lose, or is it not applicable? Default is N/A",
     required=False,
-    autocomplete=discord.utils.basic_autocomplete(get_log_results)
+    autocomplete=get_log_results
 )
 async def practice(ctx, *, date_of: str, duration: float, unit: str, result: str = "N/A", team_id: int = None, team_name=None):
 
-    error = verify_parameters_for_log(ctx, result, unit, duration, date_of, team_id, team_name)
+    error = await verify_parameters_for_log(ctx, result, unit, duration, date_of, team_id, team_name)
     if error:
         await ctx.respond(error)
         return
 
-    team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+    team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
 
     if date_of:
         if date_of.count("/") < 2:
@@ -269,9 +365,9 @@ async def practice(ctx, *, date_of: str, duration: float, unit: str, result: str
     else:
         date_of = datetime.date.today()
 
-    duration = f"{duration} {unit}" if unit != "best-of" else f"{unit}-{duration}"
-
-    logger.add_log(team_id, date_of, duration, "Practice", ctx.author.name, result)
+    guild = await get_partition(ctx)
+    await guild.async_logger.add_log(team_id, date_of, duration, unit, "Practice", ctx.author.name, result)
+    await guild.violator_report.refresh([team_id])
 
     await ctx.respond("Logged practice")
 
@@ -281,7 +377,7 @@ async def practice(ctx, *, date_of: str, duration: float, unit: str, result: str
     "team_name",
     str,
     description="Optional: The name of the team you want to operate on.",
-    autocomplete=discord.utils.basic_autocomplete(get_team_names),
+    autocomplete=get_team_names,
     required=False
 )
 @discord.option(
@@ -295,7 +391,7 @@ async def practice(ctx, *, date_of: str, duration: float, unit: str, result: str
     str,
     description="The unit of time you're measuring your practice in. For example \"hours\" or \"best-of\".",
     required=True,
-    autocomplete=discord.utils.basic_autocomplete(get_unit_options)
+    autocomplete=get_unit_options
 )
 @discord.option(
     "date_of",
@@ -308,7 +404,7 @@ async def practice(ctx, *, date_of: str, duration: float, unit: str, result: str
     str,
     description="Did you win, lose, or is it not applicable? Default is N/A",
     required=False,
-    autocomplete=discord.utils.basic_autocomplete(get_log_results)
+    autocomplete=get_log_results
 )
 @discord.option(
     "opponent_name",
@@ -318,12 +414,12 @@ async def practice(ctx, *, date_of: str, duration: float, unit: str, result: str
 )
 async def scrim(ctx, *, date_of: str, duration: float, unit: str, result: str = "N/A", opponent_name: str = None, team_id: int = None, team_name=None):
 
-    error = verify_parameters_for_log(ctx, result, unit, duration, date_of, team_id, team_name)
+    error = await verify_parameters_for_log(ctx, result, unit, duration, date_of, team_id, team_name)
     if error:
         await ctx.respond(error)
         return
 
-    team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+    team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
 
     if date_of:
         if date_of.count("/") < 2:
@@ -337,24 +433,82 @@ async def scrim(ctx, *, date_of: str, duration: float, unit: str, result: str =
     else:
         date_of = datetime.date.today()
 
-    duration = f"{int(duration)} {unit}" if unit != "best-of" else f"{unit}-{duration}"
-
-    logger.add_log(team_id, date_of, duration, "Scrimmage", ctx.author.name, result, opponent_name)
+    guild = await get_partition(ctx)
+    await guild.async_logger.add_log(team_id, date_of, duration, unit, "Scrimmage", ctx.author.name, result, opponent_name)
+    await guild.violator_report.refresh([team_id])
 
     await ctx.respond("Logged scrim")
 
 
+def read_import(team_map: dict[int, dict], text: str, default_team_id: int, submitted_by: str) -> LogImport:
+    team_name_to_id = {team["team_name"]: team_id for team_id, team in team_map.items()}
+    log_import = LogImport(team_name_to_id, team_map.keys(), log_types, result_options)
+    log_import.read(text, default_team_id, submitted_by)
+    return log_import
+
+@logs.command(name="import", description="Logs every row of a CSV file.")  # guild_ids=[566299354088865812]
+@discord.option(
+    "file",
+    discord.Attachment,
+    description="A CSV with a header line of date, duration, unit, type, result, opponent and team columns.",
+    required=True
+)
+@discord.option(
+    "team_name",
+    str,
+    description="Optional: The team of rows that don't have a team column.",
+    autocomplete=get_team_names,
+    required=False
+)
+async def import_logs(ctx, *, file: discord.Attachment, team_name=None, team_id: int = None):
+    try:
+        default_team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+    except TeamNotFoundException:
+        default_team_id = None
+
+    if file.size > MAX_IMPORT_BYTES:
+        await ctx.respond(f"The file must be smaller than {MAX_IMPORT_BYTES // (1024 * 1024)} MB.")
+        return
+    await ctx.defer()
+    try:
+        text = (await file.read()).decode("utf-8-sig")
+    except UnicodeDecodeError:
+        await ctx.respond("The file must be a UTF-8 CSV.")
+        return
+
+    guild = await get_partition(ctx)
+    # The rows are checked against a copy of the teams, so that team lookups don't wait for a big import.
+    team_map = await guild.async_logger.run(TEAMS_KEY, get_team_map, guild.logger)
+    log_import = await guild.async_logger.run(IMPORT_KEY, read_import, team_map, text, default_team_id, ctx.author.name)
+    # One append per team, and the teams write in parallel.
+    await asyncio.gather(*[
+        guild.async_logger.add_logs(team_id, entries) for team_id, entries in log_import.entries.items()
+    ])
+    if log_import.entries:
+        await guild.violator_report.refresh(list(log_import.entries))
+
+    message = f"Logged {log_import.accepted_count} of {log_import.row_count} rows for {len(log_import.entries)} team(s)."
+    if log_import.errors:
+        errors = "\n".join(log_import.errors)
+        if len(message) + len(errors) + 10 <= MESSAGE_LIMIT:
+            await ctx.respond(message + "\n" + format_codeblock(errors))
+        else:
+            await ctx.respond(message, file=discord.File(io.BytesIO(errors.encode()), filename="import_errors.txt"))
+    else:
+        await ctx.respond(message)
+
+
 @teams.command(description="Adds a player to a team.")  # guild_ids=[566299354088865812]
 @discord.option(
     "team_name",
     str,
     description="Optional: The name of the team you want to operate on.",
-    autocomplete=discord.utils.basic_autocomplete(get_team_names),
+    autocomplete=get_team_names,
     required=False
 )
 async def add_player(ctx, *, player: discord.Member, team_id: int = None, team_name=None):
     try:
-        team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+        team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
     except TeamNotFoundException:
         await ctx.respond(
             "Could not find team! The command user must pass a team name, a team id, or be listed as a player on a team.")
@@ -362,10 +516,12 @@ async def add_player(ctx, *, player: discord.Member, team_id: int = None, team_n
 
     if not isinstance(player, int):
         player = player.id
+    guild = await get_partition(ctx)
+    team = await guild.async_logger.add_player_to_team(team_id, player)
     await ctx.respond(
         format_codeblock(
             format_json(
-                logger.add_player_to_team(team_id, player)
+                team
             ),
             "json"
         )
@@ -376,12 +532,12 @@ async def add_player(ctx, *, player: discord.Member, team_id: int = None, team_n
     "team_name",
     str,
     description="Optional: The name of the team you want to operate on.",
-    autocomplete=discord.utils.basic_autocomplete(get_team_names),
+    autocomplete=get_team_names,
     required=False
 )
 async def remove_player(ctx, *, player: discord.Member, team_id: int = None, team_name=None):
     try:
-        team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+        team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
     except TeamNotFoundException:
         await ctx.respond(
             "Could not find team! The command user must pass a team name, a team id, or be listed as a player on a team.")
@@ -389,10 +545,12 @@ async def remove_player(ctx, *, player: discord.Member, team_id: int = None, tea
 
     if not isinstance(player, int):
         player = player.id
+    guild = await get_partition(ctx)
+    team = await guild.async_logger.remove_player_from_team(team_id, player)
     await ctx.respond(
         format_codeblock(
             format_json(
-                logger.remove_player_from_team(team_id, player)
+                team
             ),
             "json"
         )
@@ -403,19 +561,65 @@ async def remove_player(ctx, *, player: discord.Member, team_id: int = None, tea
     "team_name",
     str,
     description="Optional: The name of the team you want to operate on.",
-    autocomplete=discord.utils.basic_autocomplete(get_team_names),
+    autocomplete=get_team_names,
     required=False
 )
 async def get_log(ctx, *, team_name=None, team_id: int = None):
     try:
-        team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+        team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+    except TeamNotFoundException:
+        await ctx.respond(
+            "Could not find team! The command user must pass a team name, a team id, or be listed as a player on a team.")
+        return
+
+    guild = await get_partition(ctx)
+    await ctx.respond(file=discord.File(await guild.async_logger.export_log(team_id), filename=f"{team_id}.csv"))
+
+@logs.command(name="range", description="Returns csv containing a team's practices between two dates.")  # guild_ids=[566299354088865812]
+@discord.option(
+    "start",
+    str,
+    description="The first date, formatted as Month/Day or Month/Day/Year. For example: 9/1",
+    required=True
+)
+@discord.option(
+    "end",
+    str,
+    description="Optional: The last date, formatted the same way. Default is today.",
+    required=False
+)
+@discord.option(
+    "team_name",
+    str,
+    description="Optional: The name of the team you want to operate on.",
+    autocomplete=get_team_names,
+    required=False
+)
+async def get_log_range(ctx, *, start: str, end: str = None, team_name=None, team_id: int = None):
+    try:
+        team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
     except TeamNotFoundException:
         await ctx.respond(
             "Could not find team! The command user must pass a team name, a team id, or be listed as a player on a team.")
         return
 
-    file_path = logger.get_log_file(id=team_id)
-    await ctx.respond(file=discord.File(file_path))
+    today = datetime.date.today()
+    try:
+        start_date = parse_log_date(start, today)
+        end_date = parse_log_date(end, today) if end else today
+    except ValueError:
+        await ctx.respond("Dates must be formatted as Month/Day or Month/Day/Year.")
+        return
+    if start_date > end_date:
+        await ctx.respond("The start date must be before the end date.")
+        return
+
+    guild = await get_partition(ctx)
+    file, count = await guild.async_logger.export_log_range(team_id, start_date, end_date)
+    await ctx.respond(
+        f"{count} logs from {start_date.strftime('%m/%d/%Y')} to {end_date.strftime('%m/%d/%Y')}",
+        file=discord.File(file, filename=f"{team_id}_{start_date.isoformat()}_{end_date.isoformat()}.csv")
+    )
 
 
 @logs.command(description="Returns csv containing practices for a team.")  # guild_ids=[566299354088865812]
@@ -423,18 +627,19 @@ async def get_log(ctx, *, team_name=None, team_id: int = None):
     "team_name",
     str,
     description="Optional: The name of the team you want to operate on.",
-    autocomplete=discord.utils.basic_autocomplete(get_team_names),
+    autocomplete=get_team_names,
     required=False
 )
 async def get_most_recent(ctx, *, team_name=None, team_id: int = None):
     try:
-        team_id = get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
+        team_id = await get_team_id_using(team_id=team_id, team_name=team_name, ctx=ctx)
     except TeamNotFoundException:
         await ctx.respond(
             "Could not find team! The command user must pass a team name, a team id, or be listed as a player on a team.")
         return
 
-    most_recent = logger.get_most_recent_practice(team_id)
+    guild = await get_partition(ctx)
+    most_recent = await guild.async_logger.get_most_recent_practice(team_id)
 
     most_recent["Date"] = most_recent["Date"].strftime("%m/%d/%Y")
     most_recent["Submitted On"] = most_recent["Submitted On"].strftime("%m/%d/%Y")
@@ -451,9 +656,10 @@ async def get_most_recent(ctx, *, team_name=None, team_id: int = None):
 async def snitch(ctx: discord.ApplicationContext):
     await ctx.respond("Snitching...")
 
-    guilty, innocent = sort_teams_into_bad_and_good()
+    guild = await get_partition(ctx)
+    guilty, innocent = await sort_teams_into_bad_and_good(guild)
 
-    inverse_map = logger.get_inverse_team_map()
+    inverse_map = await guild.async_logger.run(TEAMS_KEY, guild.logger.get_inverse_team_map)
 
     guilty = "\n\t".join([f"{inverse_map[team_id]}: {last_practice_date}" for team_id, last_practice_date in guilty])
     innocent = "\n\t".join([f"{inverse_map[team_id]}: {last_practice_date}" for team_id, last_practice_date in innocent])
@@ -464,23 +670,114 @@ async def snitch(ctx: discord.ApplicationContext):
 
 @logs.command(description="Pings teams which have not practiced.")  # guild_ids=[566299354088865812]
 @discord.default_permissions(manage_messages=True)
-async def ping_violators(ctx: discord.ApplicationContext):
-    guilty, innocent = sort_teams_into_bad_and_good()
-    inverse_map = logger.get_inverse_team_map()
-
-    to_ping = {team_id: logger.get_team(team_id)["players"] for team_id, last_practice in guilty}
+@discord.option(
+    "dm",
+    bool,
+    description="Optional: Also DM every player on a team that needs to practice.",
+    required=False
+)
+async def ping_violators(ctx: discord.ApplicationContext, *, dm: bool = False):
+    guild = await get_partition(ctx)
+    guilty, innocent = await sort_teams_into_bad_and_good(guild)
 
-    if len(to_ping) == 0:
+    team_map = await guild.async_logger.run(TEAMS_KEY, get_team_map, guild.logger)
+    msg = format_violators(team_map, guilty)
+    if msg is None:
         await ctx.respond("There are no violators!!!")
         return
 
-    msg = "The following teams need to practice:\n"
-    for team_id, players in to_ping.items():
-        msg += f"**{inverse_map[team_id]}**:\n\t" + "\n\t".join([f"<@{player}>" for player in players]) + "\n"
-
-    await ctx.respond(msg)
+    await dispatcher.respond(ctx, msg)
+    if dm:
+        # A big wave of DMs takes a while at Discord's rate limits, it is sent in the background and reported on
+        # when it is done.
+        task = asyncio.create_task(report_dms(ctx, team_map, guilty))
+        dm_tasks.add(task)
+        task.add_done_callback(dm_tasks.discard)
 
 @logs.command(description="Creates and returns a file with every single log in it.")
-async def get_mega_log(ctx: discord.ApplicationContext):
-    file_path = logger.get_mega_log()
-    await ctx.respond(file=discord.File(file_path))
+@discord.option(
+    "compression",
+    str,
+    description="Optional: Compress the file. It is zipped automatically if it is too big to upload.",
+    choices=["gzip", "zip"],
+    required=False
+)
+@discord.option(
+    "format",
+    str,
+    description="Optional: \"parquet\" or \"arrow\" for a typed, compressed columnar file. Default is csv.",
+    choices=["csv", "parquet", "arrow"],
+    required=False
+)
+async def get_mega_log(ctx: discord.ApplicationContext, *, compression: str = None, format: str = "csv"):
+    await ctx.defer()
+    guild = await get_partition(ctx)
+    async_logger = guild.async_logger
+    if format in COLUMNAR_FORMATS:
+        try:
+            file, filename = await async_logger.get_mega_log_columnar(format)
+        except RuntimeError as error:
+            await ctx.respond(str(error))
+            return
+        await ctx.respond(file=discord.File(file, filename=filename))
+        return
+
+    file, filename = await async_logger.get_mega_log(compression)
+
+    if compression is None and ctx.guild is not None and file.getbuffer().nbytes > ctx.guild.filesize_limit:
+        file, filename = await async_logger.get_mega_log("zip")
+
+    await ctx.respond(file=discord.File(file, filename=filename))
+
+
+@logs.command(description="Shows weekly practice hours, scrim frequency and win rates.")
+@discord.option(
+    "by",
+    str,
+    description="Optional: Group the stats by team or by game. Default is team.",
+    choices=["team", "game"],
+    required=False
+)
+@discord.option(
+    "weeks",
+    int,
+    description="Optional: How many weeks back to look. Default is 4.",
+    min_value=1,
+    required=False
+)
+async def stats(ctx: discord.ApplicationContext, *, by: str = "team", weeks: int = 4):
+    await ctx.defer()
+    guild = await get_partition(ctx)
+    rows = await guild.async_logger.run(STATS_KEY, guild.analytics.get_stats, by, weeks)
+
+    lines = [f"{by.title():<20} {'Hours/wk':>8} {'Scrims/wk':>9} {'Win rate':>8}"]
+    for row in rows:
+        win_rate = "-" if math.isnan(row["win_rate"]) else f"{row['win_rate']:.0%}"
+        lines.append(f"{row['name'][:20]:<20} {row['weekly_hours']:>8.1f} {row['weekly_scrims']:>9.1f} {win_rate:>8}")
+
+    table = "\n".join(lines)
+    # Each team is a 49 character row, so about 40 teams fill a message.
+    if len(format_codeblock(table)) <= MESSAGE_LIMIT:
+        await ctx.respond(format_codeblock(table))
+    else:
+        await ctx.respond(file=discord.File(io.BytesIO(table.encode()), filename="stats.txt"))
+
+
+@admin.command(name="metrics", description="Shows how long commands and storage operations take.")
+@discord.option(
+    "format",
+    str,
+    description="Optional: \"prometheus\" for the raw metrics as a file. Default is a summary table.",
+    choices=["table", "prometheus"],
+    required=False
+)
+async def get_metrics(ctx: discord.ApplicationContext, *, format: str = "table"):
+    if format == "prometheus":
+        await ctx.respond(file=discord.File(io.BytesIO(metrics.to_prometheus().encode()), filename="metrics.prom"))
+        return
+
+    summary = metrics.summary()
+    try:
+        await ctx.respond(format_codeblock(summary))
+    except discord.HTTPException:
+        await ctx.respond(file=discord.File(io.BytesIO(summary.encode()), filename="metrics.txt"))
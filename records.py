@@ -0,0 +1,132 @@
+import datetime
+import enum
+from dataclasses import dataclass
+
+# The columns of a log as people see it, in exports and in version 1 log files.
+LOG_HEADERS = ["Date", "Length", "Type", "Submitted On", "Submitted By", "Result", "Opponent"]
+
+# Version 2 log files start with this line, followed by STORED_HEADERS. Dates are stored as ordinals and the
+# length is split into a number and a Unit, so nothing has to be parsed beyond int() and float().
+LOG_FORMAT_VERSION = 2
+LOG_FORMAT_LINE = f"#log-format {LOG_FORMAT_VERSION}"
+STORED_HEADERS = ["Date", "Duration", "Unit", "Type", "Submitted On", "Submitted By", "Result", "Opponent"]
+
+
+class Unit(enum.IntEnum):
+    HOURS = 0
+    GAMES = 1
+    MAPS = 2
+    BEST_OF = 3
+    UNKNOWN = 4
+
+    @property
+    def label(self) -> str:
+        return self.name.lower().replace("_", "-")
+
+    @classmethod
+    def from_label(cls, label: str) -> "Unit":
+        for unit in cls:
+            if unit.label == label.strip().lower():
+                return unit
+        return cls.UNKNOWN
+
+
+def format_amount(amount: float) -> str:
+    return str(int(amount)) if float(amount).is_integer() else str(amount)
+
+
+def parse_length(length: str) -> tuple[float, Unit]:
+    """
+    Reads a version 1 "Length" column, which is "2.0 hours", "2 hours" or "best-of-5.0".
+    :param length: The length as it was logged.
+    :return: (duration, unit). Anything unreadable is (0.0, Unit.UNKNOWN).
+    """
+    length = (length or "").strip()
+    try:
+        if length.lower().startswith("best-of-"):
+            return float(length[len("best-of-"):]), Unit.BEST_OF
+        amount, label = length.split(maxsplit=1)
+        return float(amount), Unit.from_label(label)
+    except ValueError:
+        return 0.0, Unit.UNKNOWN
+
+
+def parse_date(date: str) -> int:
+    return datetime.datetime.strptime(date, "%m/%d/%Y").toordinal()
+
+
+def format_date(ordinal: int) -> str:
+    return datetime.date.fromordinal(ordinal).strftime("%m/%d/%Y")
+
+
+@dataclass(frozen=True, slots=True)
+class LogEntry:
+    """
+    One practice, scrimmage or match. Dates are proleptic Gregorian ordinals (datetime.date.toordinal()).
+    """
+    date: int
+    duration: float
+    unit: Unit
+    log_type: str
+    submitted_on: int
+    submitted_by: str
+    result: str
+    opponent: str = ""
+
+    @property
+    def length(self) -> str:
+        if self.unit == Unit.BEST_OF:
+            return f"best-of-{format_amount(self.duration)}"
+        return f"{format_amount(self.duration)} {self.unit.label}"
+
+    def to_list(self) -> list:
+        """
+        The version 2 on-disk representation, in STORED_HEADERS order.
+        """
+        return [
+            self.date, self.duration, int(self.unit), self.log_type,
+            self.submitted_on, self.submitted_by, self.result, self.opponent
+        ]
+
+    @classmethod
+    def from_list(cls, values: list) -> "LogEntry":
+        date, duration, unit, log_type, submitted_on, submitted_by, result, opponent = values
+        return cls(int(date), float(duration), Unit(int(unit)), log_type, int(submitted_on), submitted_by, result, opponent)
+
+    def to_row(self) -> dict:
+        """
+        The version 1 representation, a dict of LOG_HEADERS to strings. This is what exports contain.
+        """
+        return {
+            "Date": format_date(self.date),
+            "Length": self.length,
+            "Type": self.log_type,
+            "Submitted On": format_date(self.submitted_on),
+            "Submitted By": self.submitted_by,
+            "Result": self.result,
+            "Opponent": self.opponent
+        }
+
+    @classmethod
+    def from_row(cls, row: dict) -> "LogEntry":
+        duration, unit = parse_length(row.get("Length"))
+        return cls(
+            parse_date(row["Date"]),
+            duration,
+            unit,
+            row.get("Type") or "",
+            parse_date(row["Submitted On"]),
+            row.get("Submitted By") or "",
+            row.get("Result") or "",
+            row.get("Opponent") or ""
+        )
+
+    def to_dict(self) -> dict:
+        """
+        The dict LogManager.get_log_as_objects has always returned: the version 1 row with real dates.
+        """
+        return {
+            **self.to_row(),
+            "Date": datetime.date.fromordinal(self.date),
+            "Submitted On": datetime.date.fromordinal(self.submitted_on)
+        }
@@ -0,0 +1,145 @@
+import os
+import threading
+from multiprocessing.connection import Client
+
+# Where the storage server listens and the key bot processes use to connect to it.
+SOCKET_ENV = "UAH_ESPORTS_STORAGE_SOCKET"
+KEY_ENV = "UAH_ESPORTS_STORAGE_KEY"
+
+
+class StorageClient:
+    """
+    A connection to a storage_server.py process. Every thread gets its own socket, so calls from
+    AsyncLogManager's worker threads never wait on each other here.
+    """
+
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self.local = threading.local()
+
+    @classmethod
+    def from_env(cls) -> "StorageClient":
+        return cls(os.environ[SOCKET_ENV], os.environ[KEY_ENV].encode())
+
+    def connect(self):
+        if getattr(self.local, "connection", None) is None:
+            self.local.connection = Client(self.address, family="AF_UNIX", authkey=self.authkey)
+        return self.local.connection
+
+    def call(self, guild_id: int, method: str, *args, **kwargs):
+        """
+        Runs a method on the server's partition for a guild.
+        :param guild_id: The guild, or None for the home partition.
+        :param method: The name of the LogManager method, or "get_stats" for PracticeAnalytics.get_stats.
+        :return: A copy of whatever the method returned. Exceptions are raised again here.
+        """
+        connection = self.connect()
+        try:
+            connection.send((guild_id, method, args, kwargs))
+            ok, result = connection.recv()
+        except (EOFError, OSError):
+            # The server went away, reconnect on the next call.
+            self.local.connection = None
+            raise
+        if not ok:
+            raise result
+        return result
+
+
+class RemoteLogManager:
+    """
+    Stands in for a guild's LogManager when the storage server owns it. Everything returned is a copy, so
+    changes have to go through the methods.
+    """
+
+    def __init__(self, client: StorageClient, guild_id: int):
+        self.client = client
+        self.guild_id = guild_id
+
+    def call(self, method: str, *args, **kwargs):
+        return self.client.call(self.guild_id, method, *args, **kwargs)
+
+    @property
+    def team_info(self) -> dict:
+        return self.call("get_team_info")
+
+    @property
+    def teams(self) -> list:
+        return self.call("get_teams")
+
+    @property
+    def teams_version(self) -> int:
+        return self.call("get_teams_version")
+
+    @property
+    def team_name_to_id(self) -> dict[str, int]:
+        return self.call("get_team_names")
+
+    def close(self):
+        # The server flushes its own storage.
+        pass
+
+    def create_team(self, team_name: str, id: str = None, player_ids: list[int] = None, game: str = None) -> int:
+        return self.call("create_team", team_name, id, player_ids, game)
+
+    def export_log(self, team_id: int):
+        return self.call("export_log", team_id)
+
+    def export_log_range(self, team_id: int, start, end):
+        return self.call("export_log_range", team_id, start, end)
+
+    def add_player_to_team(self, team_id: int, player_id: int) -> dict:
+        return self.call("add_player_to_team", team_id, player_id)
+
+    def remove_player_from_team(self, team_id: int, player_id: int) -> dict:
+        return self.call("remove_player_from_team", team_id, player_id)
+
+    def get_team(self, team_id: int) -> dict:
+        return self.call("get_team", team_id)
+
+    def get_teams_of_player(self, player_id: int) -> set:
+        return self.call("get_teams_of_player", player_id)
+
+    def add_game_to_team(self, team_id: int, game_name: str) -> dict:
+        return self.call("add_game_to_team", team_id, game_name)
+
+    def rename_team(self, team_id: int, team_name: str) -> dict:
+        return self.call("rename_team", team_id, team_name)
+
+    def add_log(self, team_id: int, *args, **kwargs):
+        return self.call("add_log", team_id, *args, **kwargs)
+
+    def add_logs(self, team_id: int, entries: list):
+        return self.call("add_logs", team_id, entries)
+
+    def get_log_entries(self, team_id: int) -> list:
+        return self.call("get_log_entries", team_id)
+
+    def get_log_as_objects(self, team_id: int) -> list[dict]:
+        return self.call("get_log_as_objects", team_id)
+
+    def get_most_recent_practice(self, team_id: int, include_matches=False) -> dict:
+        return self.call("get_most_recent_practice", team_id, include_matches)
+
+    def get_inverse_team_map(self) -> dict[int, str]:
+        return self.call("get_inverse_team_map")
+
+    def get_team_table(self, team_id: int):
+        return self.call("get_team_table", team_id)
+
+    def get_mega_log(self, compression: str = None):
+        return self.call("get_mega_log", compression)
+
+
+class RemoteAnalytics:
+    """
+    Stands in for a guild's PracticeAnalytics, the statistics are computed on the storage server.
+    """
+
+    def __init__(self, client: StorageClient, guild_id: int):
+        self.client = client
+        self.guild_id = guild_id
+
+    def get_stats(self, by: str = "team", weeks: int = 4, today=None) -> list[dict]:
+        return self.client.call(self.guild_id, "get_stats", by, weeks, today)
@@ -0,0 +1,140 @@
+import io
+import json
+
+import discord
+
+from metrics import metrics
+
+# Discord's limits on a message's content and an embed's description.
+MESSAGE_LIMIT = 2000
+EMBED_LIMIT = 4096
+# More pages than this are sent as a file instead.
+MAX_PAGES = 20
+
+
+def codeblock(code: str, language: str = "") -> str:
+    return f"```{language}\n{code}```"
+
+
+class Rendered:
+    """
+    A response rendered ahead of time, in the one form that fits: a message, pages of embeds or a file.
+    """
+    __slots__ = ("content", "pages", "file_data", "filename")
+
+    def __init__(self, content: str = None, pages: list[str] = None, file_data: bytes = None, filename: str = None):
+        self.content = content
+        self.pages = pages
+        self.file_data = file_data
+        self.filename = filename
+
+
+def paginate_json(items: list, limit: int) -> list[str]:
+    """
+    Splits a list into JSON arrays that each fit in a codeblock of at most `limit` characters. Items are never
+    split, so together the pages read like json.dumps(items, indent=4).
+    :return: The pages as codeblocks, or None if a single item doesn't fit on a page.
+    """
+    pages = []
+    page = []
+    for item in items:
+        text = "    " + json.dumps(item, indent=4).replace("\n", "\n    ")
+        if len(codeblock("[\n" + ",\n".join(page + [text]) + "\n]", "json")) > limit:
+            if not page:
+                return None
+            pages.append(page)
+            page = [text]
+            if len(codeblock("[\n" + text + "\n]", "json")) > limit:
+                return None
+        else:
+            page.append(text)
+    if page or not pages:
+        pages.append(page)
+    return [codeblock("[\n" + ",\n".join(page) + "\n]", "json") for page in pages]
+
+
+def render_json(items: list, filename: str, file_value=None) -> Rendered:
+    """
+    Renders a list as JSON, picking how to send it from its size.
+    :param items: The list to render.
+    :param filename: What to call the file if it has to be sent as one.
+    :param file_value: Optional: what to put in the file instead of the list.
+    :return: A single codeblock if it fits in a message, pages of embeds if it fits in MAX_PAGES of them, and
+        a file otherwise.
+    """
+    text = codeblock(json.dumps(items, indent=4), "json")
+    if len(text) <= MESSAGE_LIMIT:
+        return Rendered(content=text)
+    pages = paginate_json(items, EMBED_LIMIT)
+    if pages is not None and len(pages) <= MAX_PAGES:
+        return Rendered(pages=pages)
+    return Rendered(
+        file_data=json.dumps(file_value if file_value is not None else items, indent=4).encode(), filename=filename
+    )
+
+
+class RenderCache:
+    """
+    Keeps the last thing rendered, until the version of the data it was rendered from changes.
+    """
+
+    def __init__(self, name: str):
+        """
+        :param name: What to call the cache in metrics.
+        """
+        self.name = name
+        self.version = None
+        self.rendered: Rendered = None
+
+    def get(self, version, render) -> Rendered:
+        hit = self.rendered is not None and self.version == version
+        metrics.record_cache(self.name, hit)
+        if not hit:
+            self.rendered = render()
+            self.version = version
+        return self.rendered
+
+
+class PageView(discord.ui.View):
+    """
+    Previous and next buttons that flip an embed through pages.
+    """
+
+    def __init__(self, pages: list[str], title: str, timeout: float = 180):
+        super().__init__(timeout=timeout)
+        self.pages = pages
+        self.title = title
+        self.page = 0
+        self.update_buttons()
+
+    def embed(self) -> discord.Embed:
+        embed = discord.Embed(title=self.title, description=self.pages[self.page])
+        embed.set_footer(text=f"Page {self.page + 1}/{len(self.pages)}")
+        return embed
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = self.page == len(self.pages) - 1
+
+    async def flip(self, interaction: discord.Interaction, step: int):
+        self.page = max(0, min(len(self.pages) - 1, self.page + step))
+        self.update_buttons()
+        await interaction.response.edit_message(embed=self.embed(), view=self)
+
+    @discord.ui.button(label="Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.flip(interaction, -1)
+
+    @discord.ui.button(label="Next", style=discord.ButtonStyle.secondary)
+    async def next_page(self, button: discord.ui.Button, interaction: discord.Interaction):
+        await self.flip(interaction, 1)
+
+
+async def send_rendered(ctx: discord.ApplicationContext, rendered: Rendered, title: str = None):
+    if rendered.content is not None:
+        await ctx.respond(rendered.content)
+    elif rendered.pages is not None:
+        view = PageView(rendered.pages, title)
+        await ctx.respond(embed=view.embed(), view=view)
+    else:
+        await ctx.respond(file=discord.File(io.BytesIO(rendered.file_data), filename=rendered.filename))
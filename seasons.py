@@ -0,0 +1,48 @@
+import collections
+import datetime
+
+from records import LogEntry, Unit
+
+# Seasons follow the academic year: spring runs from January through July and fall from August through December.
+FALL_START_MONTH = 8
+
+
+def season_of(ordinal: int) -> str:
+    """
+    :return: The season a date falls in, such as "2025-fall" or "2026-spring".
+    """
+    date = datetime.date.fromordinal(ordinal)
+    return f"{date.year}-{'fall' if date.month >= FALL_START_MONTH else 'spring'}"
+
+
+def season_bounds(season: str) -> tuple[int, int]:
+    """
+    :return: The first and last day of a season, as ordinals.
+    """
+    year, half = season.split("-")
+    year = int(year)
+    if half == "fall":
+        return datetime.date(year, FALL_START_MONTH, 1).toordinal(), datetime.date(year, 12, 31).toordinal()
+    return datetime.date(year, 1, 1).toordinal(), datetime.date(year, FALL_START_MONTH, 1).toordinal() - 1
+
+
+def summarize(entries: list[LogEntry]) -> dict:
+    """
+    The stats kept for a sealed season, so that it doesn't have to be read to answer them.
+    Entries are stored as LogEntry.to_list() lists, and latest maps each log type to [position, entry].
+    """
+    latest = {}
+    for position, entry in enumerate(entries):
+        current = latest.get(entry.log_type)
+        if current is None or entry.date > current[1].date:
+            latest[entry.log_type] = (position, entry)
+    return {
+        "count": len(entries),
+        "start": min(entry.date for entry in entries),
+        "end": max(entry.date for entry in entries),
+        "first": entries[0].to_list(),
+        "latest": {log_type: [position, entry.to_list()] for log_type, (position, entry) in latest.items()},
+        "types": dict(collections.Counter(entry.log_type for entry in entries)),
+        "results": dict(collections.Counter(entry.result for entry in entries)),
+        "hours": sum(entry.duration for entry in entries if entry.unit == Unit.HOURS)
+    }
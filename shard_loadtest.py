@@ -0,0 +1,151 @@
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from multiprocessing.connection import Client
+
+import loadtest
+import practice_log_cog
+from guilds import GuildPartitions
+from remote import StorageClient
+from storage_server import StorageServer
+
+# Local stand-in for a sharded deployment: one storage_server.py process and several shard processes. Each shard
+# runs loadtest.py's command mix (/log practice, /log scrim, /team add_player, /log snitch, /log get_mega_log and
+# team name autocompletes) through the real cog commands, for the guilds Discord would route to its shard, as fast
+# as it can. It prints the combined throughput for each number of shard processes.
+# Command handling, rendering and autocomplete run in the shard processes and spread over the CPUs, but every
+# LogManager call still goes to the one storage server. Throughput rises with shards only while there are CPUs to
+# spare and the server has headroom, and levels off at what the server can serve.
+# Usage: python shard_loadtest.py [seconds per run] [most shards]
+
+GUILD_COUNT = 16
+TEAMS_PER_GUILD = 4
+PLAYERS_PER_TEAM = 5
+# Commands each shard process has in flight at once.
+CONCURRENCY = 8
+
+
+def get_shard_id(guild_id: int, shard_count: int) -> int:
+    # The formula Discord uses to route a guild to a shard.
+    return (guild_id >> 22) % shard_count
+
+
+def run_server(data_root: str, address: str, authkey: bytes):
+    StorageServer(GuildPartitions(data_root=data_root), address, authkey).serve_forever()
+
+
+def synthesize(guild_teams: dict[int, list[dict]]) -> list[dict]:
+    """
+    A sample of loadtest.py's command mix for each guild, tagged with the guild it comes from.
+    """
+    events = []
+    for guild_id, team_list in guild_teams.items():
+        for event in loadtest.synthesize(team_list, 200, 1.0, seed=guild_id):
+            event["guild"] = guild_id
+            events.append(event)
+    return events
+
+
+async def play(events: list[dict], seconds: float) -> tuple[int, list[str]]:
+    deadline = time.perf_counter() + seconds
+    commands = 0
+    errors = []
+
+    async def worker():
+        nonlocal commands
+        while time.perf_counter() < deadline:
+            try:
+                await loadtest.play(random.choice(events))
+                commands += 1
+            except Exception as error:
+                errors.append(repr(error))
+
+    await asyncio.gather(*[worker() for _ in range(CONCURRENCY)])
+    return commands, errors
+
+
+def run_shard(address: str, authkey: bytes, guild_teams: dict, start: float, seconds: float, results):
+    practice_log_cog.partitions = GuildPartitions(client=StorageClient(address, authkey), max_workers=CONCURRENCY)
+    events = synthesize(guild_teams)
+    time.sleep(max(0.0, start - time.time()))
+    results.put(asyncio.run(play(events, seconds)))
+    practice_log_cog.partitions.close()
+
+
+def main():
+    seconds = float(sys.argv[1]) if len(sys.argv) > 1 else 5.0
+    most_shards = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    directory = tempfile.mkdtemp(prefix="shard_loadtest_")
+    address = os.path.join(directory, "storage.sock")
+    authkey = os.urandom(16)
+    server = multiprocessing.Process(target=run_server, args=(directory + "/", address, authkey), daemon=True)
+    server.start()
+    while True:
+        try:
+            Client(address, family="AF_UNIX", authkey=authkey).close()
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(0.05)
+
+    guild_ids = [(index + 1) << 22 for index in range(GUILD_COUNT)]
+    guild_teams = {}
+    setup = GuildPartitions(client=StorageClient(address, authkey))
+    for guild_id in guild_ids:
+        guild_teams[guild_id] = []
+        for team in range(TEAMS_PER_GUILD):
+            players = [guild_id + team * PLAYERS_PER_TEAM + player for player in range(PLAYERS_PER_TEAM)]
+            team_name = f"Team {team}"
+            setup.get(guild_id).logger.create_team(team_name, player_ids=players, game="Rocket League")
+            guild_teams[guild_id].append({"team_name": team_name, "players": players})
+    setup.close()
+
+    print(f"{'Shards':>6} {'Commands/s':>10} {'Speedup':>8}")
+    baseline = None
+    errors = []
+    shard_count = 1
+    while shard_count <= most_shards:
+        results = multiprocessing.Queue()
+        start = time.time() + 1.0
+        shards = [
+            multiprocessing.Process(target=run_shard, args=(
+                address,
+                authkey,
+                {
+                    guild_id: teams for guild_id, teams in guild_teams.items()
+                    if get_shard_id(guild_id, shard_count) == shard_id
+                },
+                start,
+                seconds,
+                results
+            ))
+            for shard_id in range(shard_count)
+        ]
+        for shard in shards:
+            shard.start()
+        commands = 0
+        for _ in shards:
+            shard_commands, shard_errors = results.get()
+            commands += shard_commands
+            errors += shard_errors
+        for shard in shards:
+            shard.join()
+
+        throughput = commands / seconds
+        baseline = baseline or throughput
+        print(f"{shard_count:>6} {throughput:>10.0f} {throughput / baseline:>7.2f}x")
+        shard_count *= 2
+
+    print(f"{os.cpu_count()} CPUs, {len(errors)} errors")
+    for error in sorted(set(errors))[:5]:
+        print(f"Error: {error}")
+    server.terminate()
+    server.join()
+
+
+if __name__ == '__main__':
+    main()
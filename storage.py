@@ -0,0 +1,761 @@
+import json, csv, os
+import atexit
+import gzip
+import io
+import re
+import tempfile
+import time
+import sqlite3
+import stat
+import datetime
+import threading
+
+from journal import LogJournal
+from log_index import SparseLogIndex
+from metrics import metrics
+from records import LOG_FORMAT_LINE, LOG_HEADERS, STORED_HEADERS, LogEntry, parse_length
+from seasons import season_bounds, season_of, summarize
+
+# write_atomically's temp files start with this, they are only left behind by a crash.
+TEMP_PREFIX = ".tmp-"
+# mkstemp creates files only the owner can read, new files get the permissions open() would have given them.
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+# The name of a hot log staged while sealing: {team id}-{generation}.csv
+PENDING_NAME = re.compile(r"(\d+)-(\d+)\.csv")
+
+
+class StorageBackend:
+    """
+    The interface LogManager uses to persist team info and logs. Logs are passed around as LogEntry records.
+    """
+
+    def load_team_info(self) -> dict:
+        raise NotImplementedError
+
+    def save_team_info(self, team_info: dict, flush: bool = False):
+        """
+        :param flush: Whether the team info must be durable before this returns, rather than whenever the backend
+        gets to it.
+        """
+        raise NotImplementedError
+
+    def create_log(self, team_id: int):
+        raise NotImplementedError
+
+    def has_log(self, team_id: int) -> bool:
+        raise NotImplementedError
+
+    def append_logs(self, team_id: int, entries: list[LogEntry]):
+        raise NotImplementedError
+
+    def append_log(self, team_id: int, entry: LogEntry):
+        self.append_logs(team_id, [entry])
+
+    def read_log(self, team_id: int) -> list[LogEntry]:
+        raise NotImplementedError
+
+    def read_log_range(self, team_id: int, start: int, end: int) -> list[LogEntry]:
+        """
+        Reads the entries of a team's log dated between two days. Backends that partition or index logs by date
+        only read the part that overlaps.
+        :param team_id: The id of the team.
+        :param start: The first day, as an ordinal.
+        :param end: The last day, as an ordinal.
+        :return: The entries, in log order.
+        """
+        return [entry for entry in self.read_log(team_id) if start <= entry.date <= end]
+
+    def count_logs(self, team_id: int) -> int:
+        """
+        :param team_id: The id of the team.
+        :return: How many entries the team's log has.
+        """
+        return len(self.read_log(team_id))
+
+    def read_summary(self, team_id: int):
+        """
+        Backends that can answer "first entry and latest entry per type" without reading the whole log
+        return them here as a (first, {type: latest}) tuple of (position, entry) pairs, plus the entry count.
+        :param team_id: The id of the team.
+        :return: (first, latest, count) or None if the backend has to read the whole log.
+        """
+        return None
+
+    def export_log(self, team_id: int) -> io.BytesIO:
+        """
+        Renders a team's log as a .csv file.
+        :param team_id: The id of the team.
+        :return: A buffer containing the .csv.
+        """
+        return export_entries(self.read_log(team_id))
+
+    def close(self):
+        pass
+
+
+def export_entries(entries: list[LogEntry]) -> io.BytesIO:
+    """
+    Renders log entries as a .csv file with the LOG_HEADERS columns.
+    """
+    buffer = io.StringIO(newline="")
+    writer = csv.DictWriter(buffer, fieldnames=LOG_HEADERS)
+    writer.writeheader()
+    writer.writerows(entry.to_row() for entry in entries)
+    return io.BytesIO(buffer.getvalue().encode())
+
+
+def is_current_log_file(path: str) -> bool:
+    with open(path, "r", newline="") as file:
+        return file.readline().rstrip("\r\n") == LOG_FORMAT_LINE
+
+
+def read_log_file(path: str) -> list[LogEntry]:
+    """
+    Reads a team's .csv log, or a gzipped one. Version 2 files are read directly, version 1 files are parsed.
+    :param path: The path to the file.
+    :return: The entries in the file.
+    """
+    archived = path.endswith(".gz")
+    with (gzip.open(path, "rt", newline="") if archived else open(path, "r", newline="")) as file:
+        metrics.record_read("archive" if archived else "log", os.path.getsize(path))
+        if file.readline().rstrip("\r\n") == LOG_FORMAT_LINE:
+            reader = csv.reader(file)
+            next(reader, None)
+            return [LogEntry.from_list(values) for values in reader if values]
+        # Version 1 files. The first line is a header, but older files have outdated headers, so it is ignored.
+        return [LogEntry.from_row(row) for row in csv.DictReader(file, fieldnames=LOG_HEADERS) if row["Date"]]
+
+
+def write_log_file(path: str, entries: list[LogEntry]):
+    """
+    Writes a team's .csv log in the current format, replacing it atomically. Paths ending in .gz are gzipped.
+    """
+    buffer = io.StringIO(newline="")
+    buffer.write(LOG_FORMAT_LINE + "\r\n")
+    writer = csv.writer(buffer)
+    writer.writerow(STORED_HEADERS)
+    writer.writerows(entry.to_list() for entry in entries)
+    if path.endswith(".gz"):
+        write_atomically(path, gzip.compress(buffer.getvalue().encode(), mtime=0), "archive")
+    else:
+        write_atomically(path, buffer.getvalue(), "log")
+
+
+def convert_log_file(path: str) -> bool:
+    """
+    Converts a version 1 log file to the current format.
+    :return: Whether the file needed converting.
+    """
+    if is_current_log_file(path):
+        return False
+    write_log_file(path, read_log_file(path))
+    return True
+
+
+def write_atomically(path: str, data, kind: str = "file"):
+    """
+    Replaces a file's contents without ever leaving a partially written file behind.
+    The data goes to a temp file in the same directory, is fsynced, and is then renamed over the original.
+    :param path: The file to write.
+    :param data: The new contents, as a str or bytes.
+    :param kind: Optional: what the file is, for metrics.
+    """
+    metrics.record_write(kind, len(data))
+    directory = os.path.dirname(path) or "."
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX, suffix=os.path.basename(path))
+    try:
+        # Keep the permissions of the file being replaced.
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~UMASK
+        os.chmod(temp_path, mode)
+        with (os.fdopen(fd, "wb") if isinstance(data, bytes) else os.fdopen(fd, "w", newline="")) as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+class WriteBehindJSON:
+    """
+    Persists a JSON document in the background. mark_dirty() schedules a write after `delay` seconds so that a
+    burst of mutations turns into a single atomic write. A delay of 0 writes immediately.
+    """
+
+    def __init__(self, path: str, delay: float = 1.0):
+        self.path = path
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.timer: threading.Timer = None
+        self.data = None
+        self.dirty = False
+        atexit.register(self.flush)
+
+    def mark_dirty(self, data):
+        """
+        Schedules the data to be written.
+        :param data: The JSON serializable data. It is serialized when it is written, not now.
+        """
+        with self.lock:
+            self.data = data
+            self.dirty = True
+            # Against the count of teams_save_seconds, shows how many saves were coalesced.
+            metrics.increment("teams_save_requests_total")
+            if self.delay <= 0:
+                self.write()
+            elif self.timer is None:
+                self.timer = threading.Timer(self.delay, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """
+        Writes the data now if there are unsaved changes.
+        """
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if self.dirty:
+                self.write()
+
+    def write(self):
+        start = time.perf_counter()
+        write_atomically(self.path, json.dumps(self.data, indent=4), "teams")
+        self.dirty = False
+        metrics.observe("teams_save_seconds", time.perf_counter() - start)
+        print("Dumped teams")
+
+
+class SeasonArchive:
+    """
+    A team's sealed seasons: one gzipped log file per season, and seasons.json with each file's name and summary.
+
+    Archives are never changed in place. Sealing writes new files under the next generation number, commits them
+    by replacing seasons.json, and only then replaces the team's hot log with what is left of it. The new hot log
+    is staged as {archive root}pending/{team id}-{generation}.csv, so that recover() can finish or undo a seal
+    that was cut short.
+    """
+
+    def __init__(self, directory: str, pending_path: str):
+        """
+        :param directory: The team's archive directory.
+        :param pending_path: Where to stage the hot log while sealing, without the generation.
+        """
+        self.directory = directory
+        self.index_path = directory + "seasons.json"
+        self.pending_path = pending_path
+        self.loaded_index: dict = None
+
+    @property
+    def index(self) -> dict:
+        if self.loaded_index is None:
+            if os.path.exists(self.index_path):
+                with open(self.index_path, "r") as file:
+                    self.loaded_index = json.load(file)
+            else:
+                self.loaded_index = {"generation": 0, "seasons": {}}
+        return self.loaded_index
+
+    def seasons(self) -> list[str]:
+        """
+        :return: The sealed seasons, oldest first.
+        """
+        return sorted(self.index["seasons"], key=season_bounds)
+
+    def read(self, season: str) -> list[LogEntry]:
+        return read_log_file(self.directory + self.index["seasons"][season]["file"])
+
+    def read_all(self) -> list[LogEntry]:
+        return [entry for season in self.seasons() for entry in self.read(season)]
+
+    def read_overlapping(self, start: int, end: int) -> list[LogEntry]:
+        """
+        Reads only the seasons with entries between two dates. The entries aren't filtered.
+        """
+        entries = []
+        for season in self.seasons():
+            summary = self.index["seasons"][season]
+            if summary["start"] <= end and summary["end"] >= start:
+                entries.extend(self.read(season))
+        return entries
+
+    def seal(self, hot_path: str, current_season: str):
+        """
+        Moves every entry of the hot log from before the current season into that season's archive.
+        Entries logged late for a season that is already sealed are merged into a new copy of its archive.
+        """
+        hot = read_log_file(hot_path)
+        current_start = season_bounds(current_season)[0]
+        sealing: dict[str, list[LogEntry]] = {}
+        remaining = []
+        for entry in hot:
+            if entry.date < current_start:
+                sealing.setdefault(season_of(entry.date), []).append(entry)
+            else:
+                remaining.append(entry)
+        if not sealing:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        generation = self.index["generation"] + 1
+        seasons = dict(self.index["seasons"])
+        for season, entries in sealing.items():
+            if season in seasons:
+                entries = self.read(season) + entries
+            filename = f"{season}.{generation}.csv.gz"
+            write_log_file(self.directory + filename, entries)
+            seasons[season] = {"file": filename, **summarize(entries)}
+
+        pending_path = f"{self.pending_path}-{generation}.csv"
+        os.makedirs(os.path.dirname(pending_path), exist_ok=True)
+        write_log_file(pending_path, remaining)
+        index = {"generation": generation, "seasons": seasons}
+        write_atomically(self.index_path, json.dumps(index, indent=4), "archive")
+        self.loaded_index = index
+        os.replace(pending_path, hot_path)
+        self.remove_unused()
+        print(f"Sealed {len(hot) - len(remaining)} logs into seasons: {', '.join(sorted(sealing, key=season_bounds))}")
+
+    def recover(self, hot_path: str, generation: int, pending_path: str):
+        """
+        Finishes a seal whose seasons.json was written, and undoes one whose seasons.json wasn't.
+        :param generation: The generation in the name of the staged hot log.
+        :param pending_path: The staged hot log.
+        """
+        if self.index["generation"] == generation:
+            os.replace(pending_path, hot_path)
+        else:
+            os.unlink(pending_path)
+        self.remove_unused()
+
+    def remove_unused(self):
+        """
+        Deletes archive files from older generations, from seals that never finished, and temp files left by a
+        crash.
+        """
+        if not os.path.isdir(self.directory):
+            return
+        used = {summary["file"] for summary in self.index["seasons"].values()}
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(TEMP_PREFIX) or entry.name.endswith(".csv.gz") and entry.name not in used:
+                    os.unlink(entry.path)
+
+
+class CSVStorage(StorageBackend):
+    """
+    The original layout: teams.json in the data root and one .csv per team in its teams/ directory.
+    """
+
+    def __init__(self, data_root: str, save_delay: float = 1.0):
+        self.data_root = data_root
+        self.teams_dir = f"{data_root}teams/"
+        os.makedirs(self.teams_dir, exist_ok=True)
+        self.team_info_writer = WriteBehindJSON(self.get_team_json_path(), save_delay)
+
+        # Registry of the log files in teams_dir so that lookups don't need a directory listing.
+        # It is reconciled with the filesystem whenever the directory's mtime changes.
+        self.log_files: set = set()
+        self.log_files_mtime: int = None
+        self.refresh_log_files()
+        # Teams whose log file is known to be in the current format. Older files are converted on first use.
+        self.current_logs: set = set()
+        self.format_lock = threading.Lock()
+
+        # Each team's log file only keeps the current season. Older seasons are sealed into
+        # {data_root}archive/{id}/ the first time the team's log is read in a new season.
+        self.archive_dir = f"{data_root}archive/"
+        self.archives: dict[int, SeasonArchive] = {}
+        self.sealed_seasons: dict[int, str] = {}
+        # Sparse date indexes over the log files, in {data_root}log_index/, for reading date ranges.
+        self.index_dir = f"{data_root}log_index/"
+        os.makedirs(self.index_dir, exist_ok=True)
+        self.log_indexes: dict[int, SparseLogIndex] = {}
+        # Seals have to be finished before the journal can fold rows into the log files.
+        self.recover_seals()
+
+        # New log rows are committed to this journal and folded into the .csv files in the background.
+        self.journal = LogJournal(data_root + "journal.log", self)
+
+    def get_team_json_path(self):
+        return self.data_root + "teams.json"
+
+    def load_team_info(self) -> dict:
+        # teams.json is only written once there is a team, its existence tells GuildPartitions there is data here.
+        if not os.path.exists(self.get_team_json_path()):
+            return {}
+        with open(self.get_team_json_path(), "r") as file:
+            metrics.record_read("teams", os.fstat(file.fileno()).st_size)
+            return json.load(file)
+
+    def save_team_info(self, team_info: dict, flush: bool = False):
+        self.team_info_writer.mark_dirty(team_info)
+        if flush:
+            self.team_info_writer.flush()
+
+    def refresh_log_files(self) -> bool:
+        """
+        Rebuilds the log file registry if the teams directory has changed since it was last scanned.
+        :return: Whether the registry was rebuilt.
+        """
+        mtime = os.stat(self.teams_dir).st_mtime_ns
+        if mtime == self.log_files_mtime:
+            return False
+        with os.scandir(self.teams_dir) as entries:
+            self.log_files = {entry.name for entry in entries if entry.is_file()}
+        self.log_files_mtime = mtime
+        return True
+
+    def has_log(self, team_id: int) -> bool:
+        """
+        Checks whether a team has a log file. Hits are answered from the registry, misses rescan the
+        directory only if it has changed.
+        :param team_id: The team id.
+        :return: Whether the log file exists.
+        """
+        log_name = f"{team_id}.csv"
+        if log_name in self.log_files:
+            return True
+        return self.refresh_log_files() and log_name in self.log_files
+
+    def get_log_path(self, team_id: int) -> str:
+        if not self.has_log(team_id):
+            raise FileNotFoundError(f"Log file does not exist for team id: \"{team_id}\"!")
+        return self.teams_dir + f"{team_id}.csv"
+
+    def create_log(self, team_id: int) -> str:
+        if self.has_log(team_id):
+            raise FileExistsError(f"Log file already exists for team id: \"{team_id}\"!")
+
+        log_path = self.teams_dir + f"{team_id}.csv"
+
+        write_log_file(log_path, [])
+        self.log_files.add(f"{team_id}.csv")
+        self.current_logs.add(team_id)
+        print(f"Log file created for team id: \"{team_id}\"!")
+        return log_path
+
+    def ensure_current_format(self, team_id: int):
+        if team_id in self.current_logs:
+            return
+        with self.format_lock:
+            if team_id in self.current_logs:
+                return
+            if convert_log_file(self.get_log_path(team_id)):
+                print(f"Converted log file for team id: \"{team_id}\" to the current format")
+            self.current_logs.add(team_id)
+
+    def append_logs(self, team_id: int, entries: list[LogEntry]):
+        self.ensure_current_format(team_id)
+        self.journal.append(team_id, entries)
+
+    def log_size(self, team_id: int) -> int:
+        return os.path.getsize(self.get_log_path(team_id))
+
+    def truncate_log(self, team_id: int, size: int):
+        self.get_log_index(team_id).invalidate()
+        os.truncate(self.get_log_path(team_id), size)
+
+    def get_log_index(self, team_id: int) -> SparseLogIndex:
+        if team_id not in self.log_indexes:
+            self.log_indexes[team_id] = SparseLogIndex(self.get_log_path(team_id), f"{self.index_dir}{team_id}.json")
+        return self.log_indexes[team_id]
+
+    def write_logs(self, team_id: int, entries: list[LogEntry]):
+        """
+        Appends entries straight to a team's .csv file and fsyncs it. Only the journal should call this.
+        """
+        with open(self.get_log_path(team_id), "a", newline="") as csvfile:
+            start = csvfile.tell()
+            logfile = csv.writer(csvfile)
+            logfile.writerows(entry.to_list() for entry in entries)
+            csvfile.flush()
+            os.fsync(csvfile.fileno())
+            metrics.record_write("log", csvfile.tell() - start)
+        # Indexes that are in use are kept up to date as rows come in, the rest catch up when they are next used.
+        if team_id in self.log_indexes:
+            self.log_indexes[team_id].update()
+
+    def get_archive(self, team_id: int) -> SeasonArchive:
+        if team_id not in self.archives:
+            self.archives[team_id] = SeasonArchive(
+                f"{self.archive_dir}{team_id}/", f"{self.archive_dir}pending/{team_id}"
+            )
+        return self.archives[team_id]
+
+    def recover_seals(self):
+        """
+        Finishes or undoes seals that a previous process was killed during, and cleans up after them.
+        """
+        pending_dir = self.archive_dir + "pending/"
+        if not os.path.isdir(pending_dir):
+            return
+        with os.scandir(pending_dir) as entries:
+            for entry in list(entries):
+                match = PENDING_NAME.fullmatch(entry.name)
+                if match is None:
+                    if entry.name.startswith(TEMP_PREFIX):
+                        # The staged hot log was still being written, so seasons.json wasn't replaced either.
+                        os.unlink(entry.path)
+                    continue
+                team_id, generation = int(match[1]), int(match[2])
+                self.get_archive(team_id).recover(self.get_log_path(team_id), generation, entry.path)
+        # A seal can also be cut short before its hot log was staged, leaving only archive files.
+        with os.scandir(self.archive_dir) as entries:
+            for entry in list(entries):
+                if entry.is_dir() and entry.name.isdigit():
+                    self.get_archive(int(entry.name)).remove_unused()
+
+    def ensure_sealed(self, team_id: int):
+        """
+        Seals the seasons before the current one out of a team's log file, once per season.
+        """
+        season = season_of(datetime.date.today().toordinal())
+        if self.sealed_seasons.get(team_id) == season:
+            return
+        self.ensure_current_format(team_id)
+        # A compaction's manifest holds the log sizes from before it, so a seal can't replace the file during one.
+        with self.journal.fold_lock:
+            if self.journal.compacting:
+                # The last compaction failed part way, and rolling it back would cut the sealed file to the sizes
+                # in its manifest. It is finished first, and if it still fails the seal waits for a later read.
+                try:
+                    self.journal.compact()
+                except Exception as e:
+                    print(f"Not sealing the log of team id: \"{team_id}\" until the log journal compacts: {e}")
+                    return
+            with self.journal.team_lock(team_id):
+                self.get_archive(team_id).seal(self.get_log_path(team_id), season)
+                self.sealed_seasons[team_id] = season
+
+    def read_hot_log(self, team_id: int) -> list[LogEntry]:
+        """
+        Reads only the current season: the team's log file and its rows still in the journal.
+        """
+        self.ensure_sealed(team_id)
+        with self.journal.team_lock(team_id):
+            return read_log_file(self.get_log_path(team_id)) + self.journal.pending_rows(team_id)
+
+    def read_log(self, team_id: int) -> list[LogEntry]:
+        self.ensure_sealed(team_id)
+        with self.journal.team_lock(team_id):
+            return self.get_archive(team_id).read_all() + self.read_hot_log(team_id)
+
+    def read_log_range(self, team_id: int, start: int, end: int) -> list[LogEntry]:
+        self.ensure_sealed(team_id)
+        with self.journal.team_lock(team_id):
+            archived = self.get_archive(team_id).read_overlapping(start, end)
+            hot = self.get_log_index(team_id).read_range(start, end)
+            pending = self.journal.pending_rows(team_id)
+        return [entry for entry in archived + hot + pending if start <= entry.date <= end]
+
+    def count_logs(self, team_id: int) -> int:
+        return self.read_summary(team_id)[2]
+
+    def read_summary(self, team_id: int):
+        """
+        Builds the summary from the sealed seasons' stored summaries and the current season, so that only the
+        current season is read.
+        """
+        self.ensure_sealed(team_id)
+        archive = self.get_archive(team_id)
+        with self.journal.team_lock(team_id):
+            hot = self.read_hot_log(team_id)
+            first = None
+            latest = {}
+            offset = 0
+            for season in archive.seasons():
+                summary = archive.index["seasons"][season]
+                if first is None:
+                    first = (0, LogEntry.from_list(summary["first"]))
+                for log_type, (position, values) in summary["latest"].items():
+                    entry = LogEntry.from_list(values)
+                    if log_type not in latest or entry.date > latest[log_type][1].date:
+                        latest[log_type] = (offset + position, entry)
+                offset += summary["count"]
+        for position, entry in enumerate(hot, start=offset):
+            if first is None:
+                first = (position, entry)
+            if entry.log_type not in latest or entry.date > latest[entry.log_type][1].date:
+                latest[entry.log_type] = (position, entry)
+        return first, latest, offset + len(hot)
+
+    def close(self):
+        self.team_info_writer.flush()
+        self.journal.close()
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Stores teams and logs in a single SQLite database in WAL mode.
+    Dates are stored as ordinals so that the (team_id, Date) and (Type, Date) indexes sort correctly.
+    """
+
+    SCHEMA_VERSION = 2
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS teams (
+            id INTEGER PRIMARY KEY,
+            team_name TEXT NOT NULL,
+            game TEXT,
+            players TEXT NOT NULL DEFAULT '[]'
+        );
+        CREATE TABLE IF NOT EXISTS team_logs (
+            team_id INTEGER PRIMARY KEY
+        );
+        CREATE TABLE IF NOT EXISTS logs (
+            team_id INTEGER NOT NULL,
+            "Date" INTEGER NOT NULL,
+            "Duration" REAL NOT NULL,
+            "Unit" INTEGER NOT NULL,
+            "Type" TEXT,
+            "Submitted On" INTEGER NOT NULL,
+            "Submitted By" TEXT,
+            "Result" TEXT,
+            "Opponent" TEXT
+        );
+        CREATE INDEX IF NOT EXISTS logs_team_date ON logs (team_id, "Date");
+        CREATE INDEX IF NOT EXISTS logs_type_date ON logs ("Type", "Date");
+    """
+
+    # These are kept as constants so every call reuses the connection's prepared statement cache.
+    INSERT_LOG = 'INSERT INTO logs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)'
+    SELECT_LOG = 'SELECT rowid, * FROM logs WHERE team_id = ? ORDER BY rowid'
+    SELECT_RANGE = 'SELECT rowid, * FROM logs WHERE team_id = ? AND "Date" BETWEEN ? AND ? ORDER BY rowid'
+    SELECT_FIRST = 'SELECT rowid, * FROM logs WHERE team_id = ? ORDER BY rowid LIMIT 1'
+    SELECT_TYPES = 'SELECT DISTINCT "Type" FROM logs WHERE team_id = ?'
+    SELECT_LATEST = 'SELECT rowid, * FROM logs WHERE team_id = ? AND "Type" = ? ORDER BY "Date" DESC, rowid LIMIT 1'
+    SELECT_COUNT = 'SELECT MAX(rowid) FROM logs WHERE team_id = ?'
+    SELECT_ROW_COUNT = 'SELECT COUNT(*) FROM logs WHERE team_id = ?'
+
+    def __init__(self, path: str):
+        self.path = path
+        # The connection is shared by AsyncLogManager's worker threads, so every use of it holds this lock.
+        self.lock = threading.RLock()
+        self.connection = sqlite3.connect(path, cached_statements=64, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.upgrade_schema()
+        self.connection.executescript(self.SCHEMA)
+        self.connection.execute(f"PRAGMA user_version={self.SCHEMA_VERSION}")
+        self.log_ids: set = {team_id for team_id, in self.connection.execute("SELECT team_id FROM team_logs")}
+
+    def upgrade_schema(self):
+        """
+        Converts a version 1 database, which stored logs as the strings from the .csv files.
+        """
+        columns = [column[1] for column in self.connection.execute("PRAGMA table_info(logs)")]
+        if "Length" not in columns:
+            return
+        with self.connection:
+            self.connection.execute("DROP INDEX IF EXISTS logs_team_date")
+            self.connection.execute("DROP INDEX IF EXISTS logs_type_date")
+            self.connection.execute("ALTER TABLE logs RENAME TO logs_v1")
+            self.connection.executescript(self.SCHEMA)
+            old_rows = self.connection.execute("SELECT * FROM logs_v1 ORDER BY rowid").fetchall()
+            new_rows = []
+            for team_id, date, length, log_type, submitted_on, submitted_by, result, opponent in old_rows:
+                duration, unit = parse_length(length)
+                new_rows.append((
+                    team_id, datetime.date.fromisoformat(date).toordinal(), duration, int(unit), log_type,
+                    datetime.date.fromisoformat(submitted_on).toordinal(), submitted_by, result, opponent
+                ))
+            self.connection.executemany(self.INSERT_LOG, new_rows)
+            self.connection.execute("DROP TABLE logs_v1")
+
+    @staticmethod
+    def row_to_entry(row: tuple) -> tuple:
+        """
+        Converts a "SELECT rowid, *" row into a LogEntry.
+        :return: (position, entry)
+        """
+        rowid, team_id, *values = row
+        return rowid, LogEntry.from_list(["" if value is None else value for value in values])
+
+    def load_team_info(self) -> dict:
+        with self.lock:
+            rows = self.connection.execute("SELECT id, team_name, game, players FROM teams ORDER BY rowid").fetchall()
+        return {"teams": [
+            {"team_name": team_name, "id": team_id, "players": json.loads(players), "game": game}
+            for team_id, team_name, game, players in rows
+        ]}
+
+    def save_team_info(self, team_info: dict, flush: bool = False):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM teams")
+            self.connection.executemany(
+                "INSERT INTO teams VALUES (?, ?, ?, ?)",
+                [(team["id"], team["team_name"], team["game"], json.dumps(team["players"])) for team in team_info["teams"]]
+            )
+
+    def has_log(self, team_id: int) -> bool:
+        return team_id in self.log_ids
+
+    def create_log(self, team_id: int):
+        if self.has_log(team_id):
+            raise FileExistsError(f"Log already exists for team id: \"{team_id}\"!")
+        with self.lock, self.connection:
+            self.connection.execute("INSERT INTO team_logs VALUES (?)", (team_id,))
+        self.log_ids.add(team_id)
+
+    def check_log(self, team_id: int):
+        if not self.has_log(team_id):
+            raise FileNotFoundError(f"Log does not exist for team id: \"{team_id}\"!")
+
+    def append_logs(self, team_id: int, entries: list[LogEntry]):
+        self.check_log(team_id)
+        values = [(team_id, *entry.to_list()) for entry in entries]
+        with self.lock, self.connection:
+            self.connection.executemany(self.INSERT_LOG, values)
+
+    def read_log(self, team_id: int) -> list[LogEntry]:
+        self.check_log(team_id)
+        with self.lock:
+            rows = self.connection.execute(self.SELECT_LOG, (team_id,)).fetchall()
+        return [self.row_to_entry(row)[1] for row in rows]
+
+    def read_log_range(self, team_id: int, start: int, end: int) -> list[LogEntry]:
+        self.check_log(team_id)
+        with self.lock:
+            rows = self.connection.execute(self.SELECT_RANGE, (team_id, start, end)).fetchall()
+        return [self.row_to_entry(row)[1] for row in rows]
+
+    def count_logs(self, team_id: int) -> int:
+        self.check_log(team_id)
+        with self.lock:
+            count, = self.connection.execute(self.SELECT_ROW_COUNT, (team_id,)).fetchone()
+        return count
+
+    def read_summary(self, team_id: int):
+        self.check_log(team_id)
+        with self.lock:
+            first = self.connection.execute(self.SELECT_FIRST, (team_id,)).fetchone()
+            if first is None:
+                return None, {}, 0
+            latest = {}
+            for log_type, in self.connection.execute(self.SELECT_TYPES, (team_id,)).fetchall():
+                latest[log_type] = self.row_to_entry(self.connection.execute(self.SELECT_LATEST, (team_id, log_type)).fetchone())
+            count, = self.connection.execute(self.SELECT_COUNT, (team_id,)).fetchone()
+        return self.row_to_entry(first), latest, count + 1
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+
+def create_storage(data_root: str) -> StorageBackend:
+    """
+    Creates the storage backend selected by the UAH_ESPORTS_STORAGE environment variable.
+    UAH_ESPORTS_SAVE_DELAY sets how many seconds teams.json changes are coalesced for.
+    :param data_root: The directory the data lives in.
+    :return: "sqlite" gives an SQLiteStorage at {data_root}esports.db, anything else gives a CSVStorage.
+    """
+    os.makedirs(data_root, exist_ok=True)
+    if os.getenv("UAH_ESPORTS_STORAGE", "csv").lower() == "sqlite":
+        return SQLiteStorage(data_root + "esports.db")
+    return CSVStorage(data_root, float(os.getenv("UAH_ESPORTS_SAVE_DELAY", "1.0")))
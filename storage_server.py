@@ -0,0 +1,108 @@
+import asyncio
+import os
+import signal
+import threading
+from multiprocessing.connection import Listener, Connection
+from multiprocessing import AuthenticationError
+
+from async_logmanager import MEGA_LOG_KEY, STATS_KEY, TEAMS_KEY
+from guilds import GuildPartition, GuildPartitions
+from remote import KEY_ENV, SOCKET_ENV
+
+# Serves every guild's teams and logs over a Unix socket, so that several bot processes (one per group of shards)
+# can share them. Start it before the bots, with the same UAH_ESPORTS_STORAGE_SOCKET and UAH_ESPORTS_STORAGE_KEY.
+# Usage: python storage_server.py
+
+# Calls that read or change team info, run under TEAMS_KEY like AsyncLogManager's team changes.
+TEAM_CALLS = {
+    "get_team": lambda logger, *args: logger.get_team(*args),
+    "get_teams_of_player": lambda logger, *args: logger.get_teams_of_player(*args),
+    "get_inverse_team_map": lambda logger: dict(logger.get_inverse_team_map()),
+    "get_team_names": lambda logger: dict(logger.team_name_to_id),
+    "get_teams": lambda logger: logger.teams,
+    "get_team_info": lambda logger: logger.team_info,
+    "get_teams_version": lambda logger: logger.teams_version,
+    "create_team": lambda logger, *args, **kwargs: logger.create_team(*args, **kwargs),
+    "add_player_to_team": lambda logger, *args: logger.add_player_to_team(*args),
+    "remove_player_from_team": lambda logger, *args: logger.remove_player_from_team(*args),
+    "add_game_to_team": lambda logger, *args: logger.add_game_to_team(*args),
+    "rename_team": lambda logger, *args: logger.rename_team(*args)
+}
+# Calls on one team's log, run under that team's lock. The team id is the first argument.
+LOG_CALLS = {
+    "add_log", "add_logs", "get_log_entries", "get_log_as_objects", "export_log", "get_most_recent_practice",
+    "get_team_table", "export_log_range"
+}
+
+
+class StorageServer:
+    """
+    Owns a GuildPartitions and runs the calls RemoteLogManagers send it. Every call goes through the
+    partition's AsyncLogManager, so calls from different bot processes are locked exactly like calls from one.
+    """
+
+    def __init__(self, partitions: GuildPartitions, address: str, authkey: bytes):
+        self.partitions = partitions
+        self.address = address
+        self.authkey = authkey
+        self.loop = asyncio.new_event_loop()
+
+    async def call(self, guild_id: int, method: str, args: tuple, kwargs: dict):
+        partition: GuildPartition = self.partitions.get(guild_id)
+        async_logger = partition.async_logger
+        if method in TEAM_CALLS:
+            return await async_logger.run(TEAMS_KEY, TEAM_CALLS[method], partition.logger, *args, **kwargs)
+        if method in LOG_CALLS:
+            return await async_logger.run(args[0], getattr(partition.logger, method), *args, **kwargs)
+        if method == "get_mega_log":
+            return await async_logger.run(MEGA_LOG_KEY, partition.logger.get_mega_log, *args, **kwargs)
+        if method == "get_stats":
+            return await async_logger.run(STATS_KEY, partition.analytics.get_stats, *args, **kwargs)
+        raise AttributeError(f"The storage server has no method: \"{method}\"!")
+
+    def handle(self, connection: Connection):
+        with connection:
+            while True:
+                try:
+                    guild_id, method, args, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    result = asyncio.run_coroutine_threadsafe(
+                        self.call(guild_id, method, args, kwargs), self.loop
+                    ).result()
+                    connection.send((True, result))
+                except Exception as error:
+                    connection.send((False, error))
+
+    def serve_forever(self):
+        threading.Thread(target=self.loop.run_forever, name="storage-server-loop", daemon=True).start()
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        with Listener(self.address, family="AF_UNIX", authkey=self.authkey) as listener:
+            os.chmod(self.address, 0o600)
+            print(f"Serving storage on {self.address}")
+            try:
+                while True:
+                    try:
+                        connection = listener.accept()
+                    except AuthenticationError:
+                        continue
+                    threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.partitions.close()
+                self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+def main():
+    # Stop cleanly on SIGTERM too, so that pending writes are flushed.
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    home_guild_id = os.getenv("UAH_ESPORTS_HOME_GUILD")
+    partitions = GuildPartitions(home_guild_id=int(home_guild_id) if home_guild_id else None)
+    StorageServer(partitions, os.environ[SOCKET_ENV], os.environ[KEY_ENV].encode()).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+class TeamRegistry:
+    """
+    Every team, indexed by id, by name and by player. The team dicts are the ones in team_info, so changing a
+    team through the registry also changes what gets saved.
+
+    All changes to teams should go through the registry so that the indexes never drift apart.
+    """
+
+    def __init__(self, teams: list[dict]):
+        self.teams = teams
+        self.by_id: dict[int, dict] = {}
+        self.name_to_id: dict[str, int] = {}
+        self.id_to_name: dict[int, str] = {}
+        self.player_teams: dict[int, set] = {}
+        for team in teams:
+            self.index(team)
+
+    def __len__(self):
+        return len(self.teams)
+
+    def __iter__(self):
+        return iter(self.teams)
+
+    def __contains__(self, team_id: int):
+        return team_id in self.by_id
+
+    def index(self, team: dict):
+        self.by_id[team["id"]] = team
+        self.name_to_id[team["team_name"]] = team["id"]
+        self.id_to_name[team["id"]] = team["team_name"]
+        for player_id in team["players"]:
+            self.player_teams.setdefault(player_id, set()).add(team["id"])
+
+    def get(self, team_id: int) -> dict:
+        assert team_id is not None
+        if team_id not in self.by_id:
+            raise LookupError(f"Cannot find team with team id: \"{team_id}\"!")
+        return self.by_id[team_id]
+
+    def get_id(self, team_name: str) -> int:
+        return self.name_to_id.get(team_name)
+
+    def get_teams_of(self, player_id: int) -> set:
+        """
+        :param player_id: The discord id of the player.
+        :return: The ids of every team the player is on.
+        """
+        return set(self.player_teams.get(player_id, ()))
+
+    def next_id(self, in_use=None) -> int:
+        """
+        :param in_use: Optional: a function that tells whether an id is taken by something other than a team.
+        """
+        team_id = len(self.teams)
+        while team_id in self.by_id or (in_use is not None and in_use(team_id)):
+            team_id += 1
+        return team_id
+
+    def add(self, team: dict) -> dict:
+        if team["id"] in self.by_id:
+            raise ValueError(f"There is already a team with team id: \"{team['id']}\"!")
+        self.teams.append(team)
+        self.index(team)
+        return team
+
+    def add_player(self, team_id: int, player_id: int) -> dict:
+        team = self.get(team_id)
+        team["players"].append(player_id)
+        self.player_teams.setdefault(player_id, set()).add(team_id)
+        return team
+
+    def remove_player(self, team_id: int, player_id: int) -> dict:
+        team = self.get(team_id)
+        team["players"].remove(player_id)
+        if player_id not in team["players"]:
+            self.player_teams[player_id].discard(team_id)
+            if not self.player_teams[player_id]:
+                del self.player_teams[player_id]
+        return team
+
+    def set_game(self, team_id: int, game: str) -> dict:
+        team = self.get(team_id)
+        team["game"] = game
+        return team
+
+    def rename(self, team_id: int, team_name: str) -> dict:
+        if team_name in self.name_to_id:
+            raise ValueError(f"There is already a team named: \"{team_name}\"!")
+        team = self.get(team_id)
+        if self.name_to_id.get(team["team_name"]) == team_id:
+            del self.name_to_id[team["team_name"]]
+        team["team_name"] = team_name
+        self.name_to_id[team_name] = team_id
+        self.id_to_name[team_id] = team_name
+        return team
@@ -0,0 +1,73 @@
+import asyncio
+import datetime
+
+from async_logmanager import TEAMS_KEY, AsyncLogManager
+
+# A team is a violator if it hasn't practiced in this many days.
+VIOLATION_DAYS = 14
+
+
+class ViolatorReport:
+    """
+    The guilty/innocent report behind /log snitch and /log ping_violators, kept precomputed.
+
+    Every team's most recent practice is fetched once. From then on refresh() is called for a team when it logs,
+    and the report is re-sorted without touching any log when the day changes, which is when teams age past
+    VIOLATION_DAYS.
+    """
+
+    def __init__(self, async_logger: AsyncLogManager, days: int = VIOLATION_DAYS):
+        self.async_logger = async_logger
+        self.days = days
+        self.lock = asyncio.Lock()
+        self.most_recent: dict[int, dict] = {}
+        self.loaded = False
+        self.guilty: list[tuple] = []
+        self.innocent: list[tuple] = []
+        self.as_of: datetime.date = None
+
+    async def refresh(self, team_ids: list[int] = None):
+        """
+        Re-reads the most recent practice of some teams and re-sorts the report.
+        :param team_ids: Optional: the teams that changed. Defaults to every team.
+        """
+        async with self.lock:
+            if team_ids is None or not self.loaded:
+                logger = self.async_logger.log_manager
+                team_ids = list(await self.async_logger.run(TEAMS_KEY, logger.get_inverse_team_map))
+                self.most_recent = {}
+                self.loaded = True
+            self.most_recent.update(await self.async_logger.get_most_recent_practices(team_ids))
+            self.sort()
+
+    def sort(self, today: datetime.date = None):
+        today = today if today else datetime.date.today()
+        threshold = today - datetime.timedelta(self.days)
+
+        guilty, innocent = [], []
+        for team, practice in self.most_recent.items():
+            if practice is None:
+                guilty.append((team, practice))
+            else:
+                tup = (team, practice["Date"].strftime("%m/%d/%Y"))
+                if practice["Date"] < threshold:
+                    guilty.append(tup)
+                else:
+                    innocent.append(tup)
+        self.guilty, self.innocent, self.as_of = guilty, innocent, today
+
+    async def update(self):
+        """
+        Brings the report up to date: loads it if it never has been and re-sorts it if the day has changed.
+        """
+        if not self.loaded:
+            await self.refresh()
+        elif self.as_of != datetime.date.today():
+            self.sort()
+
+    async def get(self) -> tuple[list, list]:
+        """
+        :return: (guilty, innocent), lists of (team id, last practice date) with None for teams that never have.
+        """
+        await self.update()
+        return self.guilty, self.innocent